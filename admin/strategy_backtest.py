@@ -0,0 +1,171 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from admin.strategy_lab_service import iter_symbol_frames, build_indicator_panel
+from admin.strategy_registry import STRATEGIES, strategy_mask
+from indicators import ST_UP, ST_DOWN
+
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Forward return horizons, in bars of the scanned timeframe
+HORIZONS = (1, 5, 10, 20)
+
+# Trades are held until the supertrend points against them,
+# for at most HOLD_CAP bars
+HOLD_CAP = 60
+
+
+# -----------------------------
+# ARRAY HELPERS
+# -----------------------------
+# All work on symbols x bars matrices, latest bar last.
+
+def _forward(a, bars):
+
+    # Value `bars` bars later; NaN past the end of the data
+    out = np.full_like(a, np.nan)
+    out[:, :-bars] = a[:, bars:]
+    return out
+
+
+def _window_extreme(a, bars, fn):
+
+    # fn over the next `bars` bars (t+1 .. t+bars); NaN when the
+    # window runs past the end of the data
+    padded = np.concatenate([a[:, 1:], np.full((a.shape[0], bars), np.nan)], axis=1)
+    windows = sliding_window_view(padded, bars, axis=1)[:, :a.shape[1]]
+    return fn(windows, axis=2)
+
+
+def _next_true(mask):
+
+    # Index of the first True strictly after each bar; width if none
+    width = mask.shape[1]
+
+    idx = np.where(mask, np.arange(width), width)
+    upcoming = np.minimum.accumulate(idx[:, ::-1], axis=1)[:, ::-1]
+
+    out = np.full_like(upcoming, width)
+    out[:, :-1] = upcoming[:, 1:]
+    return out
+
+
+def _stats(returns):
+
+    returns = returns[~np.isnan(returns)]
+
+    if not len(returns):
+        return {"trades": 0, "hit_rate": None, "avg_return": None, "median_return": None}
+
+    return {
+        "trades": int(len(returns)),
+        "hit_rate": round(float((returns > 0).mean() * 100), 1),
+        "avg_return": round(float(returns.mean()), 2),
+        "median_return": round(float(np.median(returns)), 2),
+    }
+
+
+def _mean(values):
+    values = values[~np.isnan(values)]
+    return round(float(values.mean()), 2) if len(values) else None
+
+
+# -----------------------------
+# BACKTEST
+# -----------------------------
+# Every bar where a strategy fires is a trade entered at that bar's
+# close, long or short per the registry. Returns are in percent and
+# already signed for the trade side.
+
+def _backtest_strategy(key, panel, cache, forward, highs, lows, exits):
+
+    spec = STRATEGIES[key]
+    sign = -1 if spec.get("side") == "short" else 1
+
+    rows, cols = np.nonzero(strategy_mask(panel, key, cache))
+
+    entry = panel["close"][rows, cols]
+
+    horizons = []
+
+    for bars in HORIZONS:
+        returns = sign * (forward[bars][rows, cols] / entry - 1) * 100
+        horizons.append({"bars": bars, **_stats(returns)})
+
+    # Excursion over the longest horizon
+    high = highs[rows, cols] / entry - 1
+    low = lows[rows, cols] / entry - 1
+
+    favourable, adverse = (high, low) if sign == 1 else (-low, -high)
+
+    # Holding period until the supertrend turns against the trade
+    last_bar = panel["close"].shape[1] - 1
+
+    exit_col = np.minimum(exits[sign][rows, cols], cols + HOLD_CAP)
+    closed = exit_col <= last_bar
+
+    held = (exit_col - cols)[closed]
+
+    exit_returns = sign * (
+        panel["close"][rows[closed], exit_col[closed]] / entry[closed] - 1
+    ) * 100
+
+    return {
+        "strategy": key,
+        "label": spec["label"],
+        "side": "short" if sign == -1 else "long",
+        "signals": int(len(rows)),
+        "symbols": int(len(np.unique(rows))),
+        "horizons": horizons,
+        "excursion": {
+            "bars": max(HORIZONS),
+            "avg_mfe": _mean(favourable * 100),
+            "avg_mae": _mean(adverse * 100),
+        },
+        "holding": {
+            "open": int((~closed).sum()),
+            "avg_bars": round(float(held.mean()), 1) if len(held) else None,
+            "median_bars": float(np.median(held)) if len(held) else None,
+            "max_bars": int(held.max()) if len(held) else None,
+            **_stats(exit_returns),
+        },
+    }
+
+
+def run_backtest(strategy_types, timeframe, use_live_candle=False):
+
+    for key in strategy_types:
+        if key not in STRATEGIES:
+            raise ValueError(f"Unknown strategy: {key}")
+
+    _, panel = build_indicator_panel(
+        iter_symbol_frames(timeframe, full_history=True),
+        timeframe
+    )
+
+    if panel is None:
+        return []
+
+    # The forming candle neither enters nor exits trades
+    if not use_live_candle:
+        panel = {name: values[:, :-1] for name, values in panel.items()}
+
+    close = panel["close"]
+    longest = max(HORIZONS)
+
+    forward = {bars: _forward(close, bars) for bars in HORIZONS}
+    highs = _window_extreme(panel["high"], longest, np.max)
+    lows = _window_extreme(panel["low"], longest, np.min)
+
+    exits = {
+        1: _next_true(panel["st_direction"] == ST_DOWN),
+        -1: _next_true(panel["st_direction"] == ST_UP),
+    }
+
+    cache = {}
+
+    return [
+        _backtest_strategy(key, panel, cache, forward, highs, lows, exits)
+        for key in strategy_types
+    ]
@@ -1,47 +1,66 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
 import pandas as pd
 import numpy as np
-from database import SessionLocal
-from models import MarketCandle
+from candle_service import (
+    load_candle_window,
+    read_candle_arrays,
+    dedupe_daily,
+    last_bar_per_day,
+    CANDLE_COLUMNS,
+    CANDLE_READER
+)
+from price_panel import open_price_panel, PANEL_PATH
+from ingestion_logs import get_data_version
+from snapshot_cache import LRUCache
+from indicator_store import load_indicator_tail
+from admin.strategy_registry import STRATEGIES, evaluate_strategies
+from indicators import supertrend_arrays, ST_LABELS, ST_PERIOD, ST_MULTIPLIER
+
+
+# Bars loaded per symbol. Long enough for EMA200 (adjust=False) to
+# forget its seed; weekly / monthly resample the full daily history.
+SCAN_BARS = {
+    "2h": 1500,
+    "daily": 1500,
+    "weekly": None,
+    "monthly": None,
+}
 
 
 # -----------------------------
 # SUPER TREND
 # -----------------------------
-def compute_supertrend(df, period=10, multiplier=2.1):
+def compute_supertrend(df, period=ST_PERIOD, multiplier=ST_MULTIPLIER):
 
-    df["H-L"] = df["High"] - df["Low"]
-    df["H-PC"] = abs(df["High"] - df["Close"].shift(1))
-    df["L-PC"] = abs(df["Low"] - df["Close"].shift(1))
+    supertrend, direction = supertrend_arrays(
+        df["High"].to_numpy(),
+        df["Low"].to_numpy(),
+        df["Close"].to_numpy(),
+        period,
+        multiplier
+    )
 
-    df["TR"] = df[["H-L", "H-PC", "L-PC"]].max(axis=1)
-    df["ATR"] = df["TR"].rolling(period).mean()
+    df["Supertrend"] = supertrend
+    df["ST_Direction"] = [ST_LABELS[int(d)] for d in direction]
 
-    df["UpperBand"] = ((df["High"] + df["Low"]) / 2) + (multiplier * df["ATR"])
-    df["LowerBand"] = ((df["High"] + df["Low"]) / 2) - (multiplier * df["ATR"])
+    return df
 
-    supertrend = []
-    direction = []
 
-    for i in range(len(df)):
-        if i == 0:
-            supertrend.append(np.nan)
-            direction.append("NA")
-            continue
+def stack_right_aligned(series_list):
 
-        if df["Close"].iloc[i] > df["UpperBand"].iloc[i - 1]:
-            direction.append("UP")
-            supertrend.append(df["LowerBand"].iloc[i])
-        elif df["Close"].iloc[i] < df["LowerBand"].iloc[i - 1]:
-            direction.append("DOWN")
-            supertrend.append(df["UpperBand"].iloc[i])
-        else:
-            direction.append(direction[i - 1])
-            supertrend.append(supertrend[i - 1])
+    # Ragged 1D arrays -> rows x max_len matrix, last bar in the last column
+    width = max(len(a) for a in series_list)
+    out = np.full((len(series_list), width), np.nan)
 
-    df["Supertrend"] = supertrend
-    df["ST_Direction"] = direction
+    for i, a in enumerate(series_list):
+        out[i, width - len(a):] = a
 
-    return df
+    return out
 
 
 # -----------------------------
@@ -71,69 +90,104 @@ def resample_timeframe(df, timeframe):
 
 
 # -----------------------------
-# MAIN SCANNER
+# CANDLE SOURCE
 # -----------------------------
-def run_strategy_scan(strategy_type, timeframe, lookback, use_live_candle=False):
+# Daily scans read the shared memory-mapped panel (already one bar
+# per trading date). Weekly / monthly scans read the bars
+# materialized at ingestion. 2h scans, or a missing panel, use the
+# windowed DB reader. Frames are yielded in the scanned timeframe.
+ROLLUP_TIMEFRAMES = {"weekly": "1w", "monthly": "1mo"}
 
-    db = SessionLocal()
 
-    try:
-        query = db.query(MarketCandle)
+def _db_window(timeframe):
 
-        if timeframe == "2h":
-            query = query.filter(
-                MarketCandle.timeframe == "2h",
-                MarketCandle.symbol.in_(["^NSEI", "^NSEBANK"])
-            )
-        else:
-            query = query.filter(MarketCandle.timeframe == "1d")
+    # Stored timeframe and symbols a scan timeframe reads
+    if timeframe == "2h":
+        return "2h", ["^NSEI", "^NSEBANK"]
 
-        rows = query.order_by(
-            MarketCandle.symbol,
-            MarketCandle.timestamp
-        ).all()
+    if timeframe in ROLLUP_TIMEFRAMES:
+        return ROLLUP_TIMEFRAMES[timeframe], None
+
+    return "1d", None
 
-    finally:
-        db.close()
 
-    if not rows:
-        return []
+def _load_db_candles(timeframe, bars=None):
 
-    df = pd.DataFrame([{
-        "symbol": r.symbol,
-        "timestamp": r.timestamp,
-        "Open": r.open,
-        "High": r.high,
-        "Low": r.low,
-        "Close": r.close,
-        "Volume": r.volume
-    } for r in rows])
+    candle_tf, symbols = _db_window(timeframe)
 
-    results = []
+    df = load_candle_window(candle_tf, bars=bars, symbols=symbols)
 
-    grouped = df.groupby("symbol")
+    df = df.rename(columns={c: c.capitalize() for c in CANDLE_COLUMNS})
 
-    for symbol, g in grouped:
+    # ---------------------------------------
+    # FIX: Remove duplicate daily candles
+    # Yahoo sometimes returns 2 timestamps
+    # (00:00 and 18:30) for the same IST day
+    # ---------------------------------------
+    if timeframe == "daily":
+        df = dedupe_daily(df)
+
+    return df
+
+
+def _db_frames(df):
+
+    for symbol, g in df.groupby("symbol"):
 
         g = g.sort_values("timestamp")
-        g.set_index("timestamp", inplace=True)
+        g = g.set_index("timestamp").drop(columns="symbol")
+
+        yield symbol, g
+
+
+def iter_symbol_frames(timeframe, full_history=False):
+
+    bars = None if full_history else SCAN_BARS.get(timeframe)
+
+    if timeframe in ROLLUP_TIMEFRAMES:
 
-        # ---------------------------------------
-        # FIX: Remove duplicate daily candles
-        # Yahoo sometimes returns 2 timestamps
-        # (00:00 and 18:30) for the same day
-        # ---------------------------------------
-        """if timeframe == "daily":
-            g["date"] = g.index.date
-            g = g.groupby("date").last()
-            g.index = pd.to_datetime(g.index)"""
+        df = _load_db_candles(timeframe, bars)
 
-        if timeframe == "daily":
-        # Remove duplicate daily candles (Yahoo timezone issue)
-            g = g[~g.index.normalize().duplicated(keep="last")]
+        if not df.empty:
+            yield from _db_frames(df)
+            return
 
-        if timeframe in ["weekly", "monthly"]:
-            g = resample_timeframe(g, timeframe)
+        # Not materialized yet: resample the daily history
+        for symbol, g in iter_symbol_frames("daily", full_history=True):
+            yield symbol, resample_timeframe(g, timeframe)
+
+        return
+
+    panel = open_price_panel() if timeframe == "daily" else None
+
+    if panel is not None:
+
+        for symbol in panel.symbols:
+
+            g = panel.symbol_frame(symbol, bars=bars)
+
+            if not g.empty:
+                yield symbol, g
+
+        return
+
+    yield from _db_frames(_load_db_candles(timeframe, bars))
+
+
+# -----------------------------
+# SCAN CORE
+# -----------------------------
+# Every scan builds one indicator panel (fields -> symbols x bars,
+# latest bar last) and evaluates all requested strategies on it.
+PANEL_FIELDS = ["close", "ema5", "ema20", "ema55", "ema80", "ema200", "supertrend", "st_direction"]
+
+
+def build_indicator_panel(frames, timeframe):
+
+    symbols = []
+    bars = {"High": [], "Low": [], "Close": []}
+
+    for symbol, g in frames:
 
         if timeframe == "daily" and len(g) < 200:
             continue
@@ -144,70 +198,772 @@ def run_strategy_scan(strategy_type, timeframe, lookback, use_live_candle=False)
         if timeframe in ["weekly", "monthly"] and len(g) < 30:
             continue
 
-        # EMAs
-        g["EMA5"] = g["Close"].ewm(span=5, adjust=False).mean()
-        g["EMA20"] = g["Close"].ewm(span=20, adjust=False).mean()
-        g["EMA55"] = g["Close"].ewm(span=55, adjust=False).mean()
-        g["EMA80"] = g["Close"].ewm(span=80, adjust=False).mean()
-        g["EMA200"] = g["Close"].ewm(span=200, adjust=False).mean()
-
-        
-       # Detect Crossovers
-    
-        g["cross_up"] = (
-            (g["EMA5"] > g["EMA20"]) &
-            (g["EMA5"].shift(1) <= g["EMA20"].shift(1))
+        symbols.append(symbol)
+
+        for name in bars:
+            bars[name].append(g[name].to_numpy(dtype=np.float64))
+
+    if not symbols:
+        return [], None
+
+    # Right-aligned, so the leading NaN padding only delays each
+    # symbol's EMA seed to its first bar
+    stacked = {name: stack_right_aligned(series) for name, series in bars.items()}
+
+    close = stacked["Close"]
+    panel = {"close": close, "high": stacked["High"], "low": stacked["Low"]}
+
+    for span in [5, 20, 55, 80, 200]:
+        panel[f"ema{span}"] = pd.DataFrame(close.T).ewm(span=span, adjust=False).mean().to_numpy().T
+
+    panel["supertrend"], panel["st_direction"] = supertrend_arrays(
+        stacked["High"], stacked["Low"], close
+    )
+
+    return symbols, panel
+
+
+def _panel_results(symbols, panel, strategy_types, lookback, use_live_candle):
+
+    hits = evaluate_strategies(panel, strategy_types, lookback, use_live_candle)
+
+    latest = {name: panel[name][:, -1] for name in PANEL_FIELDS}
+
+    results = {}
+
+    for key, (rows, bars_since) in hits.items():
+
+        results[key] = []
+
+        for i in rows:
+
+            st_value = latest["supertrend"][i]
+
+            results[key].append({
+                "symbol": symbols[i],
+                "price": round(float(latest["close"][i]), 2),
+                "ema5": round(float(latest["ema5"][i]), 2),
+                "ema20": round(float(latest["ema20"][i]), 2),
+                "ema55": round(float(latest["ema55"][i]), 2),
+                "ema80": round(float(latest["ema80"][i]), 2),
+                "ema200": round(float(latest["ema200"][i]), 2),
+                "st_direction": ST_LABELS[int(latest["st_direction"][i])],
+                "st_value": round(float(st_value), 2)
+                    if not np.isnan(st_value) else None,
+                "bars_since_cross": int(bars_since[i])
+            })
+
+    return results
+
+
+def _scan_frames(frames, strategy_types, timeframe, lookback, use_live_candle):
+
+    symbols, panel = build_indicator_panel(frames, timeframe)
+
+    if panel is None:
+        return {key: [] for key in strategy_types}
+
+    return _panel_results(symbols, panel, strategy_types, lookback, use_live_candle)
+
+
+# -----------------------------
+# INDICATOR STORE
+# -----------------------------
+# Daily and 2h scans read EMAs / supertrend maintained at ingestion
+# and only look at the last few bars. Weekly / monthly, or an empty
+# store, go through the frame scan below.
+STORE_TIMEFRAMES = {"daily": "1d", "2h": "2h"}
+
+STORE_SYMBOLS = {"2h": ["^NSEI", "^NSEBANK"]}
+
+# Same minimum history as the daily / 2h frame scan
+STORE_MIN_BARS = 200
+
+
+def _store_panel(timeframe, lookback):
+
+    # Closed bars back to `lookback`, the bar before them and the live
+    # bar. The first column has no previous bar, so a signal there is
+    # always older than `lookback`.
+    tail = load_indicator_tail(
+        STORE_TIMEFRAMES[timeframe],
+        bars=lookback + 3,
+        symbols=STORE_SYMBOLS.get(timeframe)
+    )
+
+    if tail.empty:
+        return None, None
+
+    tail["pos"] = tail.groupby("symbol").cumcount(ascending=False)
+
+    # Latest rows decide eligibility
+    latest = tail[tail["pos"] == 0]
+    eligible = set(latest.loc[latest["bar_index"] + 1 >= STORE_MIN_BARS, "symbol"])
+
+    tail = tail[tail["symbol"].isin(eligible)]
+
+    if tail.empty:
+        return [], None
+
+    # symbols x bars, latest bar in the last column
+    wide = tail.pivot(index="symbol", columns="pos").sort_index(axis=1, level="pos", ascending=False)
+
+    panel = {name: wide[name].to_numpy(dtype=np.float64) for name in PANEL_FIELDS}
+
+    return list(wide.index), panel
+
+
+def _scan_indicator_store(strategy_types, timeframe, lookback, use_live_candle):
+
+    symbols, panel = _store_panel(timeframe, lookback)
+
+    if symbols is None:
+        return None
+
+    if panel is None:
+        return {key: [] for key in strategy_types}
+
+    return _panel_results(symbols, panel, strategy_types, lookback, use_live_candle)
+
+
+# -----------------------------
+# PARALLEL EXECUTION
+# -----------------------------
+# Symbols are sharded across a persistent process pool. Workers never
+# receive DataFrames: they map the price panel file themselves, or
+# attach to a SharedMemory block the parent filled once (fields x
+# bars x symbols float64). Small universes stay serial. The pool is
+# shared by every request of the web process, so it stays small by
+# default; raise STRATEGY_SCAN_WORKERS on a dedicated host.
+SCAN_WORKERS = int(os.getenv("STRATEGY_SCAN_WORKERS", 2))
+PARALLEL_MIN_SYMBOLS = int(os.getenv("STRATEGY_SCAN_PARALLEL_MIN", 200))
+
+SHM_FIELDS = [c.capitalize() for c in CANDLE_COLUMNS]
+
+_POOL = None
+_POOL_SIZE = 0
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool(workers):
+
+    global _POOL, _POOL_SIZE
+
+    with _POOL_LOCK:
+
+        if _POOL is None or _POOL_SIZE != workers:
+
+            if _POOL is not None:
+                _POOL.shutdown(wait=False, cancel_futures=True)
+
+            # spawn: the web process runs threads (scheduler, caches)
+            _POOL = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _POOL_SIZE = workers
+
+        return _POOL
+
+
+def _reset_pool():
+
+    global _POOL
+
+    with _POOL_LOCK:
+
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+
+        _POOL = None
+
+
+def _candle_block(timeframe):
+
+    # (fields x timestamps x symbols) block straight from the COPY
+    # reader's arrays, without building a frame to unstack
+    candle_tf, symbols = _db_window(timeframe)
+
+    arrays = read_candle_arrays(candle_tf, SCAN_BARS.get(timeframe), symbols=symbols)
+
+    codes = arrays["codes"]
+    ts = arrays["timestamp"]
+
+    if not len(codes):
+        return None, [], None
+
+    keep = slice(None)
+
+    # Same duplicate daily candle fix as _load_db_candles: last bar
+    # per symbol and IST date
+    if timeframe == "daily":
+        keep = last_bar_per_day(codes, ts)
+
+    stamps, row = np.unique(ts[keep], return_inverse=True)
+
+    order = np.argsort(arrays["symbols"])
+    column = np.empty_like(order)
+    column[order] = np.arange(len(order))
+
+    col = column[codes[keep]]
+
+    block = np.full((len(SHM_FIELDS), len(stamps), len(order)), np.nan)
+
+    for k, c in enumerate(CANDLE_COLUMNS):
+        block[k, row, col] = arrays[c][keep]
+
+    index = pd.to_datetime(stamps, unit="us", utc=True)
+
+    return block, index, list(arrays["symbols"][order])
+
+
+def _frame_block(timeframe):
+
+    df = _load_db_candles(timeframe, SCAN_BARS.get(timeframe))
+
+    if df.empty:
+        return None, [], None
+
+    wide = df.set_index(["timestamp", "symbol"])[SHM_FIELDS].unstack("symbol").sort_index()
+    symbols = list(wide["Close"].columns)
+
+    block = np.stack([
+        wide[field].reindex(columns=symbols).to_numpy(dtype=np.float64)
+        for field in SHM_FIELDS
+    ])
+
+    return block, wide.index, symbols
+
+
+def _db_block(timeframe):
+
+    if CANDLE_READER == "copy":
+        return _candle_block(timeframe)
+
+    return _frame_block(timeframe)
+
+
+def _share_source(source):
+
+    # (source workers can attach to, shared memory block to release
+    # or None). In-process blocks are copied into SharedMemory once.
+    if source[0] != "block":
+        return source, None
+
+    _, block, index, symbols = source
+
+    shm = shared_memory.SharedMemory(create=True, size=block.nbytes)
+    np.ndarray(block.shape, dtype=np.float64, buffer=shm.buf)[:] = block
+
+    return ("shm", shm.name, block.shape, index, symbols), shm
+
+
+def _block_frames(block, index, all_symbols, symbols):
+
+    column = {s: i for i, s in enumerate(all_symbols)}
+
+    for symbol in symbols:
+
+        # Copy out: the frame must outlive the mapping
+        g = pd.DataFrame(
+            {f: block[k, :, column[symbol]].copy() for k, f in enumerate(SHM_FIELDS)},
+            index=index
+        ).dropna(subset=["Close"])
+
+        if not g.empty:
+            yield symbol, g
+
+
+def _source_frames(source, symbols, timeframe):
+
+    if source[0] == "panel":
+
+        panel = open_price_panel(source[1])
+
+        for symbol in symbols:
+
+            g = panel.symbol_frame(symbol, bars=SCAN_BARS.get(timeframe))
+
+            # Weekly / monthly bars not materialized yet
+            if timeframe in ROLLUP_TIMEFRAMES:
+                g = resample_timeframe(g, timeframe)
+
+            if not g.empty:
+                yield symbol, g
+
+        return
+
+    if source[0] == "block":
+        _, block, index, all_symbols = source
+        yield from _block_frames(block, index, all_symbols, symbols)
+        return
+
+    _, name, shape, index, all_symbols = source
+
+    shm = shared_memory.SharedMemory(name=name)
+
+    try:
+        block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+        yield from _block_frames(block, index, all_symbols, symbols)
+
+        del block
+
+    finally:
+        shm.close()
+
+
+def _scan_shard(source, symbols, strategy_types, timeframe, lookback, use_live_candle):
+
+    return _scan_frames(
+        _source_frames(source, symbols, timeframe),
+        strategy_types,
+        timeframe,
+        lookback,
+        use_live_candle
+    )
+
+
+def _scan_source(timeframe):
+
+    # (source, symbols). DB candles are loaded once into an in-process
+    # block; _share_source moves it to SharedMemory only when a pool
+    # will actually read it.
+    if timeframe != "daily":
+
+        block, index, symbols = _db_block(timeframe)
+
+        if block is not None:
+            return ("block", block, index, symbols), symbols
+
+        if timeframe not in ROLLUP_TIMEFRAMES:
+            return None, []
+
+    panel = open_price_panel()
+
+    if panel is not None:
+        return ("panel", PANEL_PATH), panel.symbols
+
+    if timeframe == "daily":
+
+        block, index, symbols = _db_block(timeframe)
+
+        if block is not None:
+            return ("block", block, index, symbols), symbols
+
+    return None, []
+
+
+def _run_parallel(strategy_types, timeframe, lookback, use_live_candle, workers):
+
+    source, symbols = _scan_source(timeframe)
+
+    if source is None:
+        return None
+
+    # Small universes scan here, from the data already loaded
+    if len(symbols) < PARALLEL_MIN_SYMBOLS:
+        return _scan_shard(source, list(symbols), strategy_types, timeframe, lookback, use_live_candle)
+
+    source, shm = _share_source(source)
+
+    try:
+        shards = [list(s) for s in np.array_split(symbols, workers) if len(s)]
+
+        pool = _get_pool(workers)
+
+        futures = [
+            pool.submit(_scan_shard, source, shard, strategy_types, timeframe, lookback, use_live_candle)
+            for shard in shards
+        ]
+
+        shard_results = [f.result() for f in futures]
+
+        # Shards are contiguous, so merging in order keeps symbol order
+        return {
+            key: [r for part in shard_results for r in part[key]]
+            for key in strategy_types
+        }
+
+    except BrokenProcessPool:
+        print("Strategy scan pool broke, falling back to serial")
+        _reset_pool()
+        return None
+
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+
+# -----------------------------
+# RESULT CACHE
+# -----------------------------
+# Sorted results per strategy, keyed on the scan inputs and the data
+# version. Repeated submissions are served from memory until the next
+# ingestion, repair or other logged write moves the version on; the
+# cache is emptied then, as older entries can never hit again.
+SCAN_CACHE = LRUCache(maxsize=int(os.getenv("STRATEGY_SCAN_CACHE_SIZE", 256)))
+
+_SCAN_VERSION = None
+_SCAN_VERSION_LOCK = threading.Lock()
+
+
+def _scan_version():
+
+    global _SCAN_VERSION
+
+    version = get_data_version()
+
+    with _SCAN_VERSION_LOCK:
+
+        if version != _SCAN_VERSION:
+            SCAN_CACHE.clear()
+            _SCAN_VERSION = version
+
+    return version
+
+
+def _cache_key(key, timeframe, lookback, use_live_candle, version):
+    return (key, timeframe, int(lookback), bool(use_live_candle), version)
+
+
+# -----------------------------
+# MAIN SCANNER
+# -----------------------------
+def _compute_scans(strategy_types, timeframe, lookback, use_live_candle, workers):
+
+    results = None
+
+    if timeframe in STORE_TIMEFRAMES:
+        results = _scan_indicator_store(strategy_types, timeframe, lookback, use_live_candle)
+
+    if results is None and workers > 1:
+        results = _run_parallel(strategy_types, timeframe, lookback, use_live_candle, workers)
+
+    if results is None:
+        results = _scan_frames(
+            iter_symbol_frames(timeframe),
+            strategy_types,
+            timeframe,
+            lookback,
+            use_live_candle
         )
 
-        g["cross_down"] = (
-            (g["EMA5"] < g["EMA20"]) &
-            (g["EMA5"].shift(1) >= g["EMA20"].shift(1))
+    # Sort by most recent signal first
+    return {
+        key: sorted(results[key], key=lambda x: x["bars_since_cross"])
+        for key in strategy_types
+    }
+
+
+def _validate(strategy_types):
+
+    for key in strategy_types:
+        if key not in STRATEGIES:
+            raise ValueError(f"Unknown strategy: {key}")
+
+    return list(dict.fromkeys(strategy_types))
+
+
+def run_strategy_scans(strategy_types, timeframe, lookback, use_live_candle=False, workers=None):
+
+    strategy_types = _validate(strategy_types)
+
+    workers = SCAN_WORKERS if workers is None else workers
+
+    version = _scan_version()
+
+    results = {
+        key: SCAN_CACHE.get(_cache_key(key, timeframe, lookback, use_live_candle, version))
+        for key in strategy_types
+    }
+
+    missing = [key for key, rows in results.items() if rows is None]
+
+    if missing:
+
+        computed = _compute_scans(missing, timeframe, lookback, use_live_candle, workers)
+
+        for key in missing:
+            SCAN_CACHE.put(_cache_key(key, timeframe, lookback, use_live_candle, version), computed[key])
+            results[key] = computed[key]
+
+    return results
+
+
+def run_strategy_scan(strategy_type, timeframe, lookback, use_live_candle=False, workers=None):
+
+    return run_strategy_scans(
+        [strategy_type],
+        timeframe,
+        lookback,
+        use_live_candle,
+        workers
+    )[strategy_type]
+
+
+# -----------------------------
+# CONFLUENCE SCANNER
+# -----------------------------
+# The same strategies on daily, weekly and monthly bars from a single
+# daily load: each symbol's full history is read once, the daily scan
+# uses its last SCAN_BARS bars and weekly / monthly are resampled
+# from it in the same pass. One row per symbol that fires on at least
+# one timeframe.
+CONFLUENCE_TIMEFRAMES = ("daily", "weekly", "monthly")
+
+
+def _confluence_frames(timeframes):
+
+    frames = {tf: [] for tf in timeframes}
+    daily_bars = SCAN_BARS["daily"]
+
+    for symbol, g in iter_symbol_frames("daily", full_history=True):
+
+        for tf in timeframes:
+
+            if tf == "daily":
+                frames[tf].append((symbol, g.tail(daily_bars)))
+            else:
+                frames[tf].append((symbol, resample_timeframe(g, tf)))
+
+    return frames
+
+
+def _confluence_rows(scans, timeframes, lookback):
+
+    rows = {}
+
+    for tf in timeframes:
+        for r in scans[tf]:
+
+            row = rows.setdefault(r["symbol"], {
+                "symbol": r["symbol"],
+                "price": r["price"],
+                "timeframes": {
+                    t: {"signal": False, "bars_since_cross": None, "st_direction": None}
+                    for t in timeframes
+                }
+            })
+
+            row["timeframes"][tf] = {
+                "signal": True,
+                "bars_since_cross": r["bars_since_cross"],
+                "st_direction": r["st_direction"]
+            }
+
+    for row in rows.values():
+        row["matches"] = sum(v["signal"] for v in row["timeframes"].values())
+
+    # Most timeframes first, then freshest signal per timeframe in order
+    def rank(row):
+        since = [
+            v["bars_since_cross"] if v["signal"] else lookback + 1
+            for v in row["timeframes"].values()
+        ]
+        return (-row["matches"], since, row["symbol"])
+
+    return sorted(rows.values(), key=rank)
+
+
+def run_confluence_scan(strategy_types, lookback, use_live_candle=False, timeframes=CONFLUENCE_TIMEFRAMES):
+
+    strategy_types = _validate(strategy_types)
+
+    for tf in timeframes:
+        if tf not in CONFLUENCE_TIMEFRAMES:
+            raise ValueError(f"Confluence timeframe must be one of {CONFLUENCE_TIMEFRAMES}: {tf}")
+
+    timeframes = tuple(dict.fromkeys(timeframes))
+
+    cache_key = (
+        "confluence",
+        tuple(strategy_types),
+        timeframes,
+        int(lookback),
+        bool(use_live_candle),
+        _scan_version()
+    )
+
+    results = SCAN_CACHE.get(cache_key)
+
+    if results is not None:
+        return results
+
+    frames = _confluence_frames(timeframes)
+
+    scans = {
+        tf: _scan_frames(frames[tf], strategy_types, tf, lookback, use_live_candle)
+        for tf in timeframes
+    }
+
+    results = {
+        key: _confluence_rows({tf: scans[tf][key] for tf in timeframes}, timeframes, lookback)
+        for key in strategy_types
+    }
+
+    SCAN_CACHE.put(cache_key, results)
+
+    return results
+
+
+# -----------------------------
+# STREAMING SCANNER
+# -----------------------------
+# Yields events as chunks of symbols finish:
+#   {"type": "progress", "processed": n, "total": m}
+#   {"type": "match", "strategy": key, "label": ..., "row": {...}}
+#   {"type": "done", "results": {key: rows sorted like run_strategy_scans}}
+# Chunks run on the scan pool when there is one, in-process otherwise.
+STREAM_CHUNK = int(os.getenv("STRATEGY_SCAN_STREAM_CHUNK", 25))
+
+
+def _progress(processed, total):
+    return {"type": "progress", "processed": processed, "total": total}
+
+
+def _chunk_scans(source, symbols, strategy_types, timeframe, lookback, use_live_candle, workers):
+
+    # (chunk size, results) in completion order
+    chunks = [symbols[i:i + STREAM_CHUNK] for i in range(0, len(symbols), STREAM_CHUNK)]
+    pending = set(range(len(chunks)))
+
+    if workers > 1 and len(chunks) > 1:
+
+        try:
+            pool = _get_pool(workers)
+
+            futures = {
+                pool.submit(_scan_shard, source, chunks[i], strategy_types, timeframe, lookback, use_live_candle): i
+                for i in range(1, len(chunks))
+            }
+
+            # The first chunk runs here while the pool picks up the rest,
+            # so a cold pool does not delay the first results
+            yield len(chunks[0]), _scan_shard(
+                source, chunks[0], strategy_types, timeframe, lookback, use_live_candle
+            )
+            pending.discard(0)
+
+            for future in as_completed(futures):
+                i = futures[future]
+                found = future.result()
+                pending.discard(i)
+                yield len(chunks[i]), found
+
+        except BrokenProcessPool:
+            print("Strategy scan pool broke, finishing stream in-process")
+            _reset_pool()
+
+    for i in sorted(pending):
+        yield len(chunks[i]), _scan_shard(
+            source, chunks[i], strategy_types, timeframe, lookback, use_live_candle
         )
 
-        
 
-        # Determine candle set based on mode
-        if use_live_candle:
-            g_closed = g
-        else:
-            g_closed = g.iloc[:-1]
+def _stream_scans(strategy_types, timeframe, lookback, use_live_candle, workers):
 
-        if strategy_type == "cross_above":
-            cross_points = g_closed.index[g_closed["cross_up"]]
-        else:
-            cross_points = g_closed.index[g_closed["cross_down"]]
+    # Yields ("found", {key: rows}) and progress events
+    symbols, panel = (
+        _store_panel(timeframe, lookback)
+        if timeframe in STORE_TIMEFRAMES else (None, None)
+    )
 
-        # No cross ever happened
-        if len(cross_points) == 0:
-            continue
+    if symbols is not None:
 
-        last_cross_index = cross_points[-1]
+        # The store answers in one query
+        if panel is not None:
+            yield "found", _panel_results(symbols, panel, strategy_types, lookback, use_live_candle)
 
-        bars_since_cross = len(g_closed) - g_closed.index.get_loc(last_cross_index) - 1
+        yield "progress", _progress(len(symbols), len(symbols))
+        return
 
-        # Apply lookback filter
-        if bars_since_cross > lookback:
-            continue
+    source, symbols = _scan_source(timeframe)
+    shm = None
 
-        # Supertrend
-        g = compute_supertrend(g)
-
-        latest = g.iloc[-1]
-
-        results.append({
-            "symbol": symbol,
-            "price": round(float(latest["Close"]), 2),
-            "ema5": round(float(latest["EMA5"]), 2),
-            "ema20": round(float(latest["EMA20"]), 2),
-            "ema55": round(float(latest["EMA55"]), 2),
-            "ema80": round(float(latest["EMA80"]), 2),
-            "ema200": round(float(latest["EMA200"]), 2),
-            "st_direction": latest["ST_Direction"],
-            "st_value": round(float(latest["Supertrend"]), 2)
-                if not np.isnan(latest["Supertrend"]) else None,
-            "bars_since_cross": bars_since_cross
-        })
+    try:
+        if source is None:
+            frames = list(iter_symbol_frames(timeframe))
+
+            yield "found", _scan_frames(frames, strategy_types, timeframe, lookback, use_live_candle)
+            yield "progress", _progress(len(frames), len(frames))
+            return
+
+        # Only a pooled run needs the block in SharedMemory
+        if workers > 1 and len(symbols) > STREAM_CHUNK:
+            source, shm = _share_source(source)
+
+        processed = 0
+        yield "progress", _progress(processed, len(symbols))
+
+        for size, found in _chunk_scans(
+            source, list(symbols), strategy_types, timeframe, lookback, use_live_candle, workers
+        ):
+            yield "found", found
+
+            processed += size
+            yield "progress", _progress(processed, len(symbols))
+
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+
+def stream_strategy_scans(strategy_types, timeframe, lookback, use_live_candle=False, workers=None):
+
+    strategy_types = _validate(strategy_types)
+
+    workers = SCAN_WORKERS if workers is None else workers
+
+    version = _scan_version()
+
+    cached = {
+        key: SCAN_CACHE.get(_cache_key(key, timeframe, lookback, use_live_candle, version))
+        for key in strategy_types
+    }
+
+    missing = [key for key, rows in cached.items() if rows is None]
+
+    def matches(found):
+        for key, rows in found.items():
+            for row in rows:
+                yield {
+                    "type": "match",
+                    "strategy": key,
+                    "label": STRATEGIES[key]["label"],
+                    "row": row
+                }
+
+    # Cached strategies first, all at once
+    yield from matches({key: rows for key, rows in cached.items() if rows is not None})
+
+    results = {key: [] for key in missing}
+
+    if missing:
+
+        for kind, payload in _stream_scans(missing, timeframe, lookback, use_live_candle, workers):
+
+            if kind == "progress":
+                yield payload
+                continue
+
+            for key, rows in payload.items():
+                results[key].extend(rows)
+
+            yield from matches(payload)
+
+        # Chunks finish out of order; symbol breaks ties like the
+        # in-order merge of run_strategy_scans
+        for key, rows in results.items():
+            rows.sort(key=lambda x: (x["bars_since_cross"], x["symbol"]))
+            SCAN_CACHE.put(_cache_key(key, timeframe, lookback, use_live_candle, version), rows)
+
+    else:
+        yield _progress(1, 1)
 
-    # Sort by most recent cross first
-    results = sorted(results, key=lambda x: x["bars_since_cross"])
-    return results
\ No newline at end of file
+    yield {
+        "type": "done",
+        "results": {key: cached[key] or results[key] for key in strategy_types}
+    }
@@ -0,0 +1,214 @@
+import numpy as np
+from indicators import ST_UP, ST_DOWN
+
+
+# -----------------------------
+# CONDITIONS
+# -----------------------------
+# Conditions are plain tuples evaluated over an indicator panel:
+# a dict of symbols x bars arrays (latest bar last) with the fields
+# close, ema5 .. ema200, supertrend and st_direction.
+#
+#   ("above", a, b)          a > b on the bar
+#   ("cross_above", a, b)    a > b on the bar, a <= b on the one before
+#   ("cross_below", a, b)    a < b on the bar, a >= b on the one before
+#   ("equals", field, value)
+#   ("stack", f1, f2, ...)   f1 > f2 > ... on the bar
+#   ("onset", cond)          cond holds on the bar but not the one before
+#   ("all", *conds) / ("any", *conds) / ("not", cond)
+#
+# Tuples are hashable, so a condition shared by several strategies
+# is evaluated once per scan.
+
+def ema_cross(fast, slow, direction="above"):
+    return (f"cross_{direction}", f"ema{fast}", f"ema{slow}")
+
+
+BULL_STACK = ("stack", "ema5", "ema20", "ema55", "ema80", "ema200")
+BEAR_STACK = ("stack", "ema200", "ema80", "ema55", "ema20", "ema5")
+
+ST_UPTREND = ("equals", "st_direction", ST_UP)
+ST_DOWNTREND = ("equals", "st_direction", ST_DOWN)
+
+
+# -----------------------------
+# REGISTRY
+# -----------------------------
+# signal:  bars that count as a hit; bars_since_cross is measured
+#          from the latest one
+# require: optional condition that must also hold on the last
+#          evaluated bar
+# side:    direction a backtest trades the signal in (default long)
+
+STRATEGIES = {
+    "cross_above": {
+        "label": "ECP1A",
+        "signal": ema_cross(5, 20, "above"),
+    },
+    "cross_below": {
+        "label": "ECP1D",
+        "signal": ema_cross(5, 20, "below"),
+        "side": "short",
+    },
+    "ema20_55_above": {
+        "label": "EMA 20 / 55 Cross Up",
+        "signal": ema_cross(20, 55, "above"),
+    },
+    "ema20_55_below": {
+        "label": "EMA 20 / 55 Cross Down",
+        "signal": ema_cross(20, 55, "below"),
+        "side": "short",
+    },
+    "ema55_200_above": {
+        "label": "EMA 55 / 200 Cross Up",
+        "signal": ema_cross(55, 200, "above"),
+    },
+    "ema55_200_below": {
+        "label": "EMA 55 / 200 Cross Down",
+        "signal": ema_cross(55, 200, "below"),
+        "side": "short",
+    },
+    "st_flip_up": {
+        "label": "Supertrend Flip Up",
+        "signal": ("onset", ST_UPTREND),
+    },
+    "st_flip_down": {
+        "label": "Supertrend Flip Down",
+        "signal": ("onset", ST_DOWNTREND),
+        "side": "short",
+    },
+    "ema_stack_bull": {
+        "label": "EMA Stack Bullish",
+        "signal": ("onset", BULL_STACK),
+        "require": BULL_STACK,
+    },
+    "ema_stack_bear": {
+        "label": "EMA Stack Bearish",
+        "signal": ("onset", BEAR_STACK),
+        "require": BEAR_STACK,
+        "side": "short",
+    },
+    "cross_above_st_up": {
+        "label": "ECP1A + Supertrend Up",
+        "signal": ("all", ema_cross(5, 20, "above"), ST_UPTREND),
+    },
+    "cross_below_st_down": {
+        "label": "ECP1D + Supertrend Down",
+        "signal": ("all", ema_cross(5, 20, "below"), ST_DOWNTREND),
+        "side": "short",
+    },
+    "st_flip_up_bull_stack": {
+        "label": "Supertrend Flip Up in Bull Stack",
+        "signal": ("onset", ST_UPTREND),
+        "require": BULL_STACK,
+    },
+}
+
+
+def strategy_options():
+    return [(key, spec["label"]) for key, spec in STRATEGIES.items()]
+
+
+# -----------------------------
+# EVALUATION
+# -----------------------------
+
+def _previous(mask):
+
+    # Value on the bar before; the first bar has none
+    out = np.zeros_like(mask)
+    out[:, 1:] = mask[:, :-1]
+    return out
+
+
+def evaluate(cond, panel, cache):
+
+    if cond in cache:
+        return cache[cond]
+
+    op, *args = cond
+
+    if op == "above":
+        mask = panel[args[0]] > panel[args[1]]
+
+    elif op == "cross_above":
+        a, b = panel[args[0]], panel[args[1]]
+        mask = (a > b) & _previous(a <= b)
+
+    elif op == "cross_below":
+        a, b = panel[args[0]], panel[args[1]]
+        mask = (a < b) & _previous(a >= b)
+
+    elif op == "equals":
+        mask = panel[args[0]] == args[1]
+
+    elif op == "stack":
+        mask = np.logical_and.reduce([
+            evaluate(("above", a, b), panel, cache)
+            for a, b in zip(args, args[1:])
+        ])
+
+    elif op == "onset":
+        inner = evaluate(args[0], panel, cache)
+        mask = inner & ~_previous(inner)
+
+    elif op == "all":
+        mask = np.logical_and.reduce([evaluate(c, panel, cache) for c in args])
+
+    elif op == "any":
+        mask = np.logical_or.reduce([evaluate(c, panel, cache) for c in args])
+
+    elif op == "not":
+        mask = ~evaluate(args[0], panel, cache)
+
+    else:
+        raise ValueError(f"Unknown condition: {op}")
+
+    cache[cond] = mask
+
+    return mask
+
+
+def strategy_mask(panel, key, cache):
+
+    # Bars where the strategy fires, with `require` checked on the bar itself
+    spec = STRATEGIES[key]
+
+    mask = evaluate(spec["signal"], panel, cache)
+
+    if "require" in spec:
+        mask = mask & evaluate(spec["require"], panel, cache)
+
+    return mask
+
+
+def evaluate_strategies(panel, strategy_types, lookback, use_live_candle):
+
+    # strategy -> (row indices of hits, bars since the latest signal)
+    cache = {}
+    hits = {}
+
+    for key in strategy_types:
+
+        spec = STRATEGIES[key]
+
+        signal = evaluate(spec["signal"], panel, cache)
+
+        if not use_live_candle:
+            signal = signal[:, :-1]
+
+        width = signal.shape[1]
+
+        if width == 0:
+            hits[key] = (np.array([], dtype=int), np.array([], dtype=int))
+            continue
+
+        bars_since = np.argmax(signal[:, ::-1], axis=1)
+        keep = signal.any(axis=1) & (bars_since <= lookback)
+
+        if "require" in spec:
+            keep &= evaluate(spec["require"], panel, cache)[:, width - 1]
+
+        hits[key] = (np.flatnonzero(keep), bars_since)
+
+    return hits
@@ -1,282 +1,250 @@
-import time
+import hashlib
+import orjson
 import pandas as pd
 
 from database import SessionLocal
-from models import MarketCandle, SymbolGroupMap
+from models import SymbolGroupMap
+from breadth_state import load_breadth_states, rebuild_breadth_state, state_frame
 from universe import load_nifty50_universe, load_banknifty_universe
-from zoneinfo import ZoneInfo
-from ingestion_logs import get_last_successful_ingestion
+from ingestion_logs import get_last_successful_ingestion, format_ingestion_time
+from snapshot_cache import SnapshotCache
+from breadth_history import load_rotation_flow
 
 
-ROTATION_HISTORY = None
+INDEX_SYMBOLS = ["^NSEI", "^NSEBANK"]
 
 # ---------------------------
 # Cache Config
 # ---------------------------
-CACHE = {}
-CACHE_TTL = 300
+# The filter-independent base snapshot is the only thing that
+# touches Postgres; filtered views are masks over it and live
+# inside the base they were derived from.
+# Ingestion jobs invalidate the cache explicitly; other processes
+# notice a new ingestion by re-checking the data version at most
+# every CACHE_CHECK_INTERVAL seconds.
+CACHE_CHECK_INTERVAL = 60
 
-ROTATION_HISTORY = None
 
-def calculate_breadth(ema5_filter=None, ema20_filter=None):
-
-    cache_key = f"{ema5_filter}_{ema20_filter}"
+# ---------------------------
+# Base snapshot
+# ---------------------------
 
-    if cache_key in CACHE:
-        cached_time, cached_data = CACHE[cache_key]
-        if time.time() - cached_time < CACHE_TTL:
-            return cached_data
+def build_breadth_base():
 
     db = SessionLocal()
 
     try:
 
-        rows = (
-            db.query(MarketCandle)
-            .filter(MarketCandle.timeframe == "1d")
-            .order_by(MarketCandle.symbol, MarketCandle.timestamp)
-            .all()
-        )
+        states = load_breadth_states(db)
 
         group_rows = db.query(SymbolGroupMap).all()
 
-        group_map = {}
-
-        for row in group_rows:
-
-            symbol = row.symbol.upper()
-
-            if symbol not in group_map:
-                group_map[symbol] = []
+        group_members = pd.DataFrame(
+            [(row.symbol.upper(), row.group_name) for row in group_rows],
+            columns=["symbol", "group"]
+        )
 
-            group_map[symbol].append(row.group_name)
+        rotation_flow = load_rotation_flow(db)
 
     finally:
         db.close()
 
-    if not rows:
-        return {}
+    # First run: backfill state from stored candles
+    if not states and rebuild_breadth_state():
 
-    nifty50_symbols = load_nifty50_universe()
-    banknifty_symbols = load_banknifty_universe()
+        db = SessionLocal()
 
-    df = pd.DataFrame([{
-        "symbol": r.symbol,
-        "timestamp": r.timestamp,
-        "Close": r.close
-    } for r in rows])
+        try:
+            states = load_breadth_states(db)
+        finally:
+            db.close()
 
-    # -----------------------------------
-    # Precompute technical indicators (vectorized)
-    # -----------------------------------
-
-    df = df.sort_values(["symbol", "timestamp"])
-
-    df["EMA5"] = df.groupby("symbol")["Close"].transform(lambda x: x.ewm(span=5).mean())
-    df["EMA20"] = df.groupby("symbol")["Close"].transform(lambda x: x.ewm(span=20).mean())
-
-    df["DMA10"] = df.groupby("symbol")["Close"].transform(lambda x: x.rolling(10).mean())
-    df["DMA20"] = df.groupby("symbol")["Close"].transform(lambda x: x.rolling(20).mean())
-    df["DMA40"] = df.groupby("symbol")["Close"].transform(lambda x: x.rolling(40).mean())
-
-    latest_timestamp = max(r.timestamp for r in rows)
-
-    result = {
-        "advances": [],
-        "declines": [],
-        "up_4_percent": [],
-        "down_4_percent": [],
-        "up_20_percent_monthly": [],
-        "down_20_percent_monthly": [],
-        "above_10_dma": [],
-        "above_20_dma": [],
-        "above_40_dma": []
-    }
-
-    sector_result = {}
+    if not states:
+        return None
 
-    nifty_data = {"close": 0, "change": 0, "pct_change": 0}
-    banknifty_data = {"close": 0, "change": 0, "pct_change": 0}
-
-    nifty_adv, nifty_dec = [], []
-    bank_adv, bank_dec = [], []
-
-    grouped = df.groupby("symbol")
+    nifty50_symbols = load_nifty50_universe()
+    banknifty_symbols = load_banknifty_universe()
 
     # -----------------------------------
-    # Pre-compute symbol dataframe lookup (performance optimization)
+    # Last row per symbol + lagged closes
     # -----------------------------------
 
-    symbol_lookup = {
-        symbol: g.sort_values("timestamp")
-        for symbol, g in grouped
-        }
-
-    total_universe = len([
-        s for s in grouped.groups.keys()
-        if s not in ["^NSEI", "^NSEBANK"]
-    ])
-
-    
-
-    for symbol, g in grouped:
+    frame = state_frame(states)
 
-        g = g.sort_values("timestamp")
+    is_index = frame["symbol"].isin(INDEX_SYMBOLS)
 
-        latest = g.iloc[-1]
+    total_universe = int((~is_index).sum())
 
-        g = g.sort_values("timestamp")
+    frame = frame[frame["bar_count"] >= 2]
 
-        if len(g) < 2:
-            continue
+    close = frame["close"]
 
-        today = g["Close"].iloc[-1]
-        yesterday = g["Close"].iloc[-2]
+    frame["change"] = close - frame["prev_close"]
+    frame["daily_pct"] = frame["change"] / frame["prev_close"] * 100
+    frame["monthly_pct"] = (close - frame["close_22"]) / frame["close_22"] * 100
 
-        change = today - yesterday
-        daily_pct = (change / yesterday) * 100
+    frame["above_ema5"] = close > frame["ema5"]
+    frame["above_ema20"] = close > frame["ema20"]
 
-        ema5 = latest["EMA5"]
-        ema20 = latest["EMA20"]
+    # -----------------------
+    # Index Handling
+    # -----------------------
 
-        stock_data = {
-            "symbol": symbol,
-            "price": round(float(today), 2),
-            "change": round(float(change), 2),
-            "pct": round(float(daily_pct), 2),
-            "above_ema5": today > ema5,
-            "above_ema20": today > ema20
+    index_quotes = {
+        row.symbol: {
+            "close": round(float(row.close), 2),
+            "change": round(float(row.change), 2),
+            "pct_change": round(float(row.daily_pct), 2)
         }
+        for row in frame[frame["symbol"].isin(INDEX_SYMBOLS)].itertuples()
+    }
 
-        # -----------------------
-        # Index Handling
-        # -----------------------
-
-        if symbol == "^NSEI":
-
-            nifty_data = {
-                "close": stock_data["price"],
-                "change": stock_data["change"],
-                "pct_change": stock_data["pct"]
-            }
-
-            continue
-
-        if symbol == "^NSEBANK":
-
-            banknifty_data = {
-                "close": stock_data["price"],
-                "change": stock_data["change"],
-                "pct_change": stock_data["pct"]
-            }
-
-            continue
+    last_ingestion = get_last_successful_ingestion()
+    last_updated = format_ingestion_time(last_ingestion)
+
+    return {
+        "frame": frame,
+        "total_universe": total_universe,
+        "index_quotes": index_quotes,
+        "group_members": group_members,
+        "rotation_flow": rotation_flow,
+        "nifty50_symbols": nifty50_symbols,
+        "banknifty_symbols": banknifty_symbols,
+        "last_updated": last_updated,
+        "data_version": last_ingestion.isoformat() if last_ingestion else "none",
+        "views": {},
+        "payloads": {}
+    }
 
-        # -----------------------
-        # EMA Filters
-        # -----------------------
 
-        if ema5_filter == "above" and not stock_data["above_ema5"]:
-            continue
+# ---------------------------
+# Base snapshot cache
+# ---------------------------
 
-        if ema5_filter == "below" and stock_data["above_ema5"]:
-            continue
+BREADTH_CACHE = SnapshotCache(
+    version_fn=get_last_successful_ingestion,
+    check_interval=CACHE_CHECK_INTERVAL
+)
 
-        if ema20_filter == "above" and not stock_data["above_ema20"]:
-            continue
 
-        if ema20_filter == "below" and stock_data["above_ema20"]:
-            continue
+def get_breadth_base():
+    return BREADTH_CACHE.get("base", build_breadth_base)
 
-        # -----------------------
-        # Advance / Decline
-        # -----------------------
 
-        if daily_pct > 0:
-            result["advances"].append(stock_data)
-        else:
-            result["declines"].append(stock_data)
+def invalidate_breadth_cache():
+    BREADTH_CACHE.invalidate(loader=build_breadth_base)
 
-        # -----------------------
-        # Sector / Theme Breadth
-        # -----------------------
 
-        groups = group_map.get(symbol, [])
+# ---------------------------
+# Filtered view
+# ---------------------------
 
-        for group in groups:
+def calculate_breadth(ema5_filter=None, ema20_filter=None, base=None):
 
-            if group not in sector_result:
-                sector_result[group] = {"adv": [], "dec": []}
+    cache_key = f"{ema5_filter}_{ema20_filter}"
 
-            if daily_pct > 0:
-                sector_result[group]["adv"].append(stock_data)
-            else:
-                sector_result[group]["dec"].append(stock_data)
+    if base is None:
+        base = get_breadth_base()
 
-        # -----------------------
-        # Index Constituents
-        # -----------------------
+    if base is None:
+        return {}
 
-        if symbol in nifty50_symbols:
-            (nifty_adv if daily_pct > 0 else nifty_dec).append(stock_data)
+    if cache_key in base["views"]:
+        return base["views"][cache_key]
 
-        if symbol in banknifty_symbols:
-            (bank_adv if daily_pct > 0 else bank_dec).append(stock_data)
+    frame = base["frame"]
+    total_universe = base["total_universe"]
+    group_members = base["group_members"]
+    nifty50_symbols = base["nifty50_symbols"]
+    banknifty_symbols = base["banknifty_symbols"]
 
-        # -----------------------
-        # ±4%
-        # -----------------------
+    empty_quote = {"close": 0, "change": 0, "pct_change": 0}
 
-        if daily_pct >= 4:
-            result["up_4_percent"].append(stock_data)
+    nifty_data = base["index_quotes"].get("^NSEI", empty_quote)
+    banknifty_data = base["index_quotes"].get("^NSEBANK", empty_quote)
 
-        if daily_pct <= -4:
-            result["down_4_percent"].append(stock_data)
+    # -----------------------
+    # EMA Filters
+    # -----------------------
 
-        # -----------------------
-        # Monthly ±20%
-        # -----------------------
+    keep = ~frame["symbol"].isin(INDEX_SYMBOLS)
 
-        if len(g) >= 22:
+    if ema5_filter == "above":
+        keep &= frame["above_ema5"]
 
-            monthly_pct = (
-                (today - g["Close"].iloc[-22])
-                / g["Close"].iloc[-22]
-                * 100
-            )
+    if ema5_filter == "below":
+        keep &= ~frame["above_ema5"]
 
-            if monthly_pct >= 20:
-                result["up_20_percent_monthly"].append(stock_data)
+    if ema20_filter == "above":
+        keep &= frame["above_ema20"]
 
-            if monthly_pct <= -20:
-                result["down_20_percent_monthly"].append(stock_data)
+    if ema20_filter == "below":
+        keep &= ~frame["above_ema20"]
 
-        # -----------------------
-        # DMA checks
-        # -----------------------
+    stocks = frame[keep]
 
-        if len(g) >= 10:
+    # -----------------------
+    # Category masks
+    # -----------------------
 
-            ##dma10 = g["Close"].rolling(10).mean().iloc[-1]
-            dma10 = latest["DMA10"]
+    pct = stocks["daily_pct"]
+    monthly_pct = stocks["monthly_pct"]
+    advancing = pct > 0
 
-            if today > dma10:
-                result["above_10_dma"].append(stock_data)
+    masks = {
+        "advances": advancing,
+        "declines": ~advancing,
+        "up_4_percent": pct >= 4,
+        "down_4_percent": pct <= -4,
+        "up_20_percent_monthly": monthly_pct >= 20,
+        "down_20_percent_monthly": monthly_pct <= -20,
+        "above_10_dma": stocks["close"] > stocks["dma10"],
+        "above_20_dma": stocks["close"] > stocks["dma20"],
+        "above_40_dma": stocks["close"] > stocks["dma40"]
+    }
 
-        if len(g) >= 20:
+    # -----------------------
+    # Materialise rendered rows only
+    # -----------------------
+
+    stock_rows = {
+        row.symbol: {
+            "symbol": row.symbol,
+            "price": round(float(row.close), 2),
+            "change": round(float(row.change), 2),
+            "pct": round(float(row.daily_pct), 2),
+            "above_ema5": bool(row.above_ema5),
+            "above_ema20": bool(row.above_ema20)
+        }
+        for row in stocks.itertuples()
+    }
 
-            dma20 = latest["DMA20"]
+    result = {
+        category: [stock_rows[s] for s in stocks["symbol"][mask]]
+        for category, mask in masks.items()
+    }
 
+    # -----------------------
+    # Index Constituents
+    # -----------------------
 
-            if today > dma20:
-                result["above_20_dma"].append(stock_data)
+    in_nifty = stocks["symbol"].isin(nifty50_symbols)
+    in_bank = stocks["symbol"].isin(banknifty_symbols)
 
-        if len(g) >= 40:
+    nifty_adv = [stock_rows[s] for s in stocks["symbol"][in_nifty & advancing]]
+    nifty_dec = [stock_rows[s] for s in stocks["symbol"][in_nifty & ~advancing]]
+    bank_adv = [stock_rows[s] for s in stocks["symbol"][in_bank & advancing]]
+    bank_dec = [stock_rows[s] for s in stocks["symbol"][in_bank & ~advancing]]
 
-            dma40 = latest["DMA40"]
+    # -----------------------
+    # Sector / Theme Breadth
+    # -----------------------
 
-            if today > dma40:
-                result["above_40_dma"].append(stock_data)
+    members = (
+        stocks[["symbol", "up_ratio_5d"]]
+        .assign(adv=advancing)
+        .merge(group_members, on="symbol")
+    )
 
     # -----------------------------------
     # Final Breadth Structuring
@@ -311,15 +279,12 @@ def calculate_breadth(ema5_filter=None, ema20_filter=None):
 
     final["sectors"] = []
 
-    for sector, values in sector_result.items():
+    for sector, g in members.groupby("group", sort=False):
 
-        adv_stocks = values["adv"]
-        dec_stocks = values["dec"]
+        adv_stocks = [stock_rows[s] for s in g["symbol"][g["adv"]]]
+        dec_stocks = [stock_rows[s] for s in g["symbol"][~g["adv"]]]
 
-        total = len(adv_stocks) + len(dec_stocks)
-
-        if total == 0:
-            continue
+        total = len(g)
 
         adv_count = len(adv_stocks)
         dec_count = len(dec_stocks)
@@ -327,36 +292,11 @@ def calculate_breadth(ema5_filter=None, ema20_filter=None):
         adv_pct = round((adv_count / total) * 100, 1)
         dec_pct = round((dec_count / total) * 100, 1)
 
-        momentum_values = []
-
-        for stock in adv_stocks + dec_stocks:
-
-            symbol = stock["symbol"]
-
-            symbol_df = symbol_lookup.get(symbol)
-
-            if symbol_df is None or len(symbol_df) < 6:
-                continue
-
-            
-
-            last_6 = symbol_df.tail(6)
-
-            moves = []
-
-            for i in range(1, len(last_6)):
+        # Mean 5-day up ratio of members with enough history
+        avg_breadth = g["up_ratio_5d"].mean()
 
-                today_close = last_6["Close"].iloc[i]
-                prev_close = last_6["Close"].iloc[i-1]
-
-                pct = (today_close - prev_close) / prev_close * 100
-
-                moves.append(1 if pct > 0 else 0)
-
-            if moves:
-                momentum_values.append(sum(moves) / len(moves) * 100)
-
-        avg_breadth = sum(momentum_values) / len(momentum_values) if momentum_values else adv_pct
+        if pd.isna(avg_breadth):
+            avg_breadth = adv_pct
 
         momentum = adv_pct - avg_breadth
 
@@ -369,8 +309,8 @@ def calculate_breadth(ema5_filter=None, ema20_filter=None):
             "dec": dec_count,
             "adv_pct": adv_pct,
             "dec_pct": dec_pct,
-            "momentum": round(momentum, 2),
-            "strength": round(strength, 1),
+            "momentum": round(float(momentum), 2),
+            "strength": round(float(strength), 1),
             "adv_stocks": sorted(adv_stocks, key=lambda x: x["pct"], reverse=True),
             "dec_stocks": sorted(dec_stocks, key=lambda x: x["pct"])
         })
@@ -515,45 +455,11 @@ def calculate_breadth(ema5_filter=None, ema20_filter=None):
     final["market_regime"] = regime
 
 
-# -----------------------------------
-# Detect Sector Rotation Flow
-# -----------------------------------
-
-    global ROTATION_HISTORY
-
-    rotation_flow = []
-
-    if "ROTATION_HISTORY" in globals() and ROTATION_HISTORY:
-
-        previous = ROTATION_HISTORY
-
-        def get_phase(sector_name, rotation_map):
-
-            for phase, sectors in rotation_map.items():
-                for s in sectors:
-                    if s["sector"] == sector_name:
-                        return phase
-
-            return None
-
-        for s in final["sectors"]:
-
-            name = s["sector"]
-
-            prev_phase = get_phase(name, previous)
-            new_phase = get_phase(name, rotation)
-
-            if prev_phase and new_phase and prev_phase != new_phase:
-
-                rotation_flow.append({
-                    "sector": name,
-                    "from": prev_phase,
-                    "to": new_phase
-                })
-
-    ROTATION_HISTORY = rotation
+    # -----------------------------------
+    # Sector Rotation Flow (day over day, from breadth_history)
+    # -----------------------------------
 
-    final["rotation_flow"] = rotation_flow
+    final["rotation_flow"] = base["rotation_flow"]
 
     # -----------------------------------
     # Index Summary
@@ -582,21 +488,50 @@ def calculate_breadth(ema5_filter=None, ema20_filter=None):
         "dec_stocks": sorted(bank_dec, key=lambda x: x["pct"])
     }
 
-    last_ingestion = get_last_successful_ingestion()
+    final["last_updated"] = base["last_updated"]
 
-    if last_ingestion:
+    base["views"][cache_key] = final
 
-        # database stores UTC
-        utc_time = last_ingestion.replace(tzinfo=ZoneInfo("UTC"))
+    return final
 
-        # convert to IST
-        ist_time = utc_time.astimezone(ZoneInfo("Asia/Kolkata"))
 
-        final["last_updated"] = ist_time.strftime("%d %b %Y %I:%M %p IST")
+# ---------------------------
+# JSON payload (API)
+# ---------------------------
+# Strong ETag from the data version and the filters, so a poller can
+# be answered with 304 from the cached base alone. The encoded body is
+# memoised next to the view it was built from. Callers answering one
+# request pass the same `base` to both, so a refresh in between cannot
+# pair one version's ETag with another version's body.
 
-    else:
-        final["last_updated"] = "Unknown"
-    
-    CACHE[cache_key] = (time.time(), final)
+def breadth_etag(ema5_filter=None, ema20_filter=None, base=None):
+
+    if base is None:
+        base = get_breadth_base()
+
+    version = base["data_version"] if base else "none"
+
+    digest = hashlib.sha1(
+        f"{version}|{ema5_filter}|{ema20_filter}".encode()
+    ).hexdigest()
+
+    return f'"{digest}"'
+
+
+def breadth_json(ema5_filter=None, ema20_filter=None, base=None):
+
+    if base is None:
+        base = get_breadth_base()
+
+    if base is None:
+        return orjson.dumps({})
+
+    cache_key = f"{ema5_filter}_{ema20_filter}"
+
+    if cache_key not in base["payloads"]:
+        base["payloads"][cache_key] = orjson.dumps(
+            calculate_breadth(ema5_filter, ema20_filter, base=base),
+            option=orjson.OPT_SERIALIZE_NUMPY
+        )
 
-    return final
\ No newline at end of file
+    return base["payloads"][cache_key]
@@ -0,0 +1,306 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import desc
+from sqlalchemy.dialects.postgresql import insert
+from database import SessionLocal
+from models import BreadthHistory, SymbolGroupMap
+from candle_service import load_candle_window, dedupe_daily
+from price_panel import open_price_panel
+
+
+# ---------------------------
+# Config
+# ---------------------------
+
+INDEX_SYMBOLS = ["^NSEI", "^NSEBANK"]
+
+# Pseudo group holding the whole stock universe
+MARKET_GROUP = "MARKET"
+
+# Bars needed before a date can be computed: DMA40 + previous close
+WARMUP_BARS = 41
+
+SAVE_CHUNK = 5000
+
+
+# ---------------------------
+# Panel
+# ---------------------------
+# dates x symbols closes. Dates are IST trading dates, which also
+# folds Yahoo's duplicate 00:00 / 18:30 UTC daily bars into one.
+
+def close_panel(df):
+
+    df = dedupe_daily(df)
+
+    dates = (
+        pd.to_datetime(df["timestamp"], utc=True)
+        .dt.tz_convert("Asia/Kolkata")
+        .dt.date
+    )
+
+    return (
+        df.assign(date=dates)
+        .pivot(index="date", columns="symbol", values="close")
+        .sort_index()
+    )
+
+
+def _membership(symbols, group_members):
+
+    groups = [MARKET_GROUP] + list(dict.fromkeys(group_members["group"]))
+
+    col = {s: i for i, s in enumerate(symbols)}
+    grp = {g: j for j, g in enumerate(groups)}
+
+    matrix = np.zeros((len(symbols), len(groups)))
+    matrix[:, 0] = 1
+
+    for symbol, group in group_members.itertuples(index=False):
+        if symbol in col:
+            matrix[col[symbol], grp[group]] = 1
+
+    return groups, matrix
+
+
+# ---------------------------
+# Vectorized history
+# ---------------------------
+# Same definitions as the live snapshot in breadth_engine, evaluated
+# for every date at once. Per-group figures are (dates x symbols)
+# masks multiplied by the (symbols x groups) membership matrix.
+
+def compute_breadth_history(panel, group_members):
+
+    stocks = panel.loc[:, ~panel.columns.isin(INDEX_SYMBOLS)]
+
+    close = stocks.to_numpy(dtype=np.float64)
+    prev = stocks.shift(1).to_numpy(dtype=np.float64)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct = (close - prev) / prev * 100
+
+    valid = ~np.isnan(pct)
+    adv = pct > 0
+
+    groups, members = _membership(list(stocks.columns), group_members)
+
+    def per_group(mask):
+        return (mask & valid).astype(np.float64) @ members
+
+    total = per_group(valid)
+    advances = per_group(adv)
+    up_4 = per_group(pct >= 4)
+    down_4 = per_group(pct <= -4)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+
+        above = {
+            window: per_group(close > stocks.rolling(window).mean().to_numpy()) / total * 100
+            for window in (10, 20, 40)
+        }
+
+        # 5-day up ratio, only where the last 6 closes exist
+        has_6 = stocks.notna().rolling(6).sum().to_numpy() == 6
+        up_ratio = (stocks.diff() > 0).rolling(5).sum().to_numpy() / 5 * 100
+        up_ratio = np.where(has_6 & valid, up_ratio, 0.0)
+
+        ratio_count = per_group(has_6)
+        ratio_mean = (up_ratio @ members) / ratio_count
+
+        adv_pct = np.round(advances / total * 100, 1)
+
+    avg_breadth = np.where(ratio_count > 0, ratio_mean, adv_pct)
+    momentum_raw = adv_pct - avg_breadth
+
+    momentum = np.round(momentum_raw, 2)
+    strength = np.round(0.7 * adv_pct + 0.3 * momentum_raw, 1)
+
+    # Same rule as the sector rotation block in breadth_engine
+    phase = np.select(
+        [
+            (adv_pct >= 50) & (momentum >= 0),
+            (adv_pct >= 50) & (momentum < 0),
+            (adv_pct < 50) & (momentum < 0),
+        ],
+        ["leading", "weakening", "lagging"],
+        default="improving"
+    )
+
+    n_dates, n_groups = total.shape
+    keep = (total > 0).ravel()
+
+    def flat(values):
+        return values.ravel()[keep]
+
+    return pd.DataFrame({
+        "date": np.repeat(np.asarray(stocks.index, dtype=object), n_groups)[keep],
+        "group_name": np.tile(np.asarray(groups, dtype=object), n_dates)[keep],
+        "advances": flat(advances).astype(int),
+        "declines": flat(total - advances).astype(int),
+        "adv_pct": flat(adv_pct),
+        "above_10_dma_pct": np.round(flat(above[10]), 1),
+        "above_20_dma_pct": np.round(flat(above[20]), 1),
+        "above_40_dma_pct": np.round(flat(above[40]), 1),
+        "up_4_count": flat(up_4).astype(int),
+        "down_4_count": flat(down_4).astype(int),
+        "momentum": flat(momentum),
+        "strength": flat(strength),
+        "phase": flat(phase),
+    })
+
+
+# ---------------------------
+# Persistence
+# ---------------------------
+
+def _load_group_members(db):
+
+    return pd.DataFrame(
+        [(r.symbol.upper(), r.group_name) for r in db.query(SymbolGroupMap).all()],
+        columns=["symbol", "group"]
+    )
+
+
+def _save_history(db, history):
+
+    records = history.to_dict("records")
+
+    for i in range(0, len(records), SAVE_CHUNK):
+
+        chunk = records[i:i + SAVE_CHUNK]
+
+        stmt = insert(BreadthHistory).values(chunk)
+
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["date", "group_name"],
+            set_={
+                c: stmt.excluded[c]
+                for c in history.columns
+                if c not in ("date", "group_name")
+            }
+        )
+
+        db.execute(stmt)
+
+
+def update_breadth_history(days=1):
+
+    db = SessionLocal()
+
+    try:
+        backfill = db.query(BreadthHistory.date).first() is None
+
+        panel = open_price_panel()
+
+        if panel is not None:
+
+            closes = panel.frame("close")
+
+            if not backfill:
+                closes = closes.iloc[-(WARMUP_BARS + days):]
+
+            closes = closes.set_axis(closes.index.date, axis=0)
+
+        else:
+
+            df = load_candle_window(
+                "1d",
+                bars=None if backfill else WARMUP_BARS + days,
+                columns=("close",),
+                db=db
+            )
+
+            if df.empty:
+                return 0
+
+            closes = close_panel(df)
+
+        history = compute_breadth_history(closes, _load_group_members(db))
+
+        if not backfill:
+            latest = sorted(history["date"].unique())[-days:]
+            history = history[history["date"].isin(latest)]
+
+        _save_history(db, history)
+        db.commit()
+
+        print(f"Breadth history updated: {len(history)} rows")
+
+        return len(history)
+
+    finally:
+        db.close()
+
+
+# ---------------------------
+# Lookups
+# ---------------------------
+
+def get_breadth_history(group_name=MARKET_GROUP, days=120, db=None):
+
+    own_session = db is None
+
+    if own_session:
+        db = SessionLocal()
+
+    try:
+        rows = (
+            db.query(BreadthHistory)
+            .filter(BreadthHistory.group_name == group_name)
+            .order_by(desc(BreadthHistory.date))
+            .limit(days)
+            .all()
+        )
+
+        return [
+            {
+                c.name: getattr(r, c.name)
+                for c in BreadthHistory.__table__.columns
+            }
+            for r in reversed(rows)
+        ]
+
+    finally:
+        if own_session:
+            db.close()
+
+
+def load_rotation_flow(db):
+
+    dates = [
+        d for (d,) in
+        db.query(BreadthHistory.date)
+        .distinct()
+        .order_by(desc(BreadthHistory.date))
+        .limit(2)
+    ]
+
+    if len(dates) < 2:
+        return []
+
+    latest, previous = dates
+
+    rows = (
+        db.query(BreadthHistory)
+        .filter(
+            BreadthHistory.date.in_(dates),
+            BreadthHistory.group_name != MARKET_GROUP
+        )
+        .order_by(desc(BreadthHistory.strength))
+        .all()
+    )
+
+    prev_phase = {r.group_name: r.phase for r in rows if r.date == previous}
+
+    return [
+        {
+            "sector": r.group_name,
+            "from": prev_phase[r.group_name],
+            "to": r.phase
+        }
+        for r in rows
+        if r.date == latest
+        and r.group_name in prev_phase
+        and prev_phase[r.group_name] != r.phase
+    ]
@@ -0,0 +1,306 @@
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from sqlalchemy.dialects.postgresql import insert
+from database import SessionLocal
+from models import BreadthState
+from candle_service import load_candle_window, dedupe_daily, trading_date
+
+
+# ---------------------------
+# Config
+# ---------------------------
+
+# Longest DMA window. Also covers the 22 bar monthly lookback
+# and the 6 closes used by sector momentum.
+STATE_WINDOW = 40
+
+EMA_SPANS = (5, 20)
+
+
+# ---------------------------
+# EMA carry
+# ---------------------------
+# pandas ewm(span=n) with adjust=True is
+#   sum((1-a)^i * x[t-i]) / sum((1-a)^i)
+# which folds exactly into a numerator / denominator pair.
+# The carry is stored as of the bar *before* the latest one so
+# a revised latest bar can be replaced without unwinding it.
+
+def _decay(span):
+    return 1 - 2 / (span + 1)
+
+
+def _fold(num, den, close, span):
+    decay = _decay(span)
+    return close + decay * num, 1 + decay * den
+
+
+def ema_from_state(state, span):
+
+    num = state[f"ema{span}_num"]
+    den = state[f"ema{span}_den"]
+
+    num, den = _fold(num, den, state["closes"][-1], span)
+
+    return num / den
+
+
+# ---------------------------
+# State transitions
+# ---------------------------
+
+def empty_state(symbol):
+
+    state = {
+        "symbol": symbol,
+        "last_timestamp": None,
+        "bar_count": 0,
+        "closes": [],
+    }
+
+    for span in EMA_SPANS:
+        state[f"ema{span}_num"] = 0.0
+        state[f"ema{span}_den"] = 0.0
+
+    return state
+
+
+def advance_state(state, timestamp, close):
+
+    if state["closes"]:
+
+        last_close = state["closes"][-1]
+
+        for span in EMA_SPANS:
+            state[f"ema{span}_num"], state[f"ema{span}_den"] = _fold(
+                state[f"ema{span}_num"],
+                state[f"ema{span}_den"],
+                last_close,
+                span
+            )
+
+    state["closes"] = (state["closes"] + [float(close)])[-STATE_WINDOW:]
+    state["last_timestamp"] = timestamp
+    state["bar_count"] += 1
+
+    return state
+
+
+def replace_last_bar(state, close):
+
+    state["closes"] = state["closes"][:-1] + [float(close)]
+
+    return state
+
+
+def build_state(symbol, bars):
+
+    state = empty_state(symbol)
+
+    for timestamp, close in bars:
+        advance_state(state, timestamp, close)
+
+    return state
+
+
+# ---------------------------
+# Vectorized view
+# ---------------------------
+# One row per symbol: latest close, lagged closes and the
+# indicators breadth needs. Windows longer than the stored
+# history come out as NaN.
+
+def close_matrix(states):
+
+    closes = np.full((len(states), STATE_WINDOW), np.nan)
+
+    for i, state in enumerate(states):
+        c = state["closes"]
+        closes[i, STATE_WINDOW - len(c):] = c
+
+    return closes
+
+
+def state_frame(states):
+
+    closes = close_matrix(states)
+
+    frame = pd.DataFrame({
+        "symbol": [s["symbol"] for s in states],
+        "bar_count": np.array([s["bar_count"] for s in states], dtype=np.int64),
+        "close": closes[:, -1],
+        "prev_close": closes[:, -2],
+        "close_22": closes[:, -22],
+    })
+
+    for window in (10, 20, 40):
+        frame[f"dma{window}"] = closes[:, -window:].mean(axis=1)
+
+    # Share of up days over the last 5 sessions (sector momentum)
+    last_6 = closes[:, -6:]
+    up_days = (np.diff(last_6, axis=1) > 0).sum(axis=1)
+
+    frame["up_ratio_5d"] = np.where(
+        np.isnan(last_6[:, 0]),
+        np.nan,
+        up_days / 5 * 100
+    )
+
+    for span in EMA_SPANS:
+
+        num = np.array([s[f"ema{span}_num"] for s in states], dtype=np.float64)
+        den = np.array([s[f"ema{span}_den"] for s in states], dtype=np.float64)
+
+        num, den = _fold(num, den, frame["close"].to_numpy(), span)
+
+        frame[f"ema{span}"] = num / den
+
+    return frame
+
+
+# ---------------------------
+# Persistence
+# ---------------------------
+
+def _state_from_row(row):
+
+    state = {
+        "symbol": row.symbol,
+        "last_timestamp": row.last_timestamp,
+        "bar_count": row.bar_count,
+        "closes": list(row.closes),
+    }
+
+    for span in EMA_SPANS:
+        state[f"ema{span}_num"] = getattr(row, f"ema{span}_num")
+        state[f"ema{span}_den"] = getattr(row, f"ema{span}_den")
+
+    return state
+
+
+def _save_states(db, states):
+
+    if not states:
+        return
+
+    rows = [
+        {**s, "updated_at": datetime.now(timezone.utc)}
+        for s in states
+    ]
+
+    stmt = insert(BreadthState).values(rows)
+
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["symbol"],
+        set_={
+            c: stmt.excluded[c]
+            for c in rows[0].keys()
+            if c != "symbol"
+        }
+    )
+
+    db.execute(stmt)
+
+
+def load_breadth_states(db):
+
+    return [_state_from_row(r) for r in db.query(BreadthState).all()]
+
+
+def _load_close_history(db, symbols=None):
+
+    # EMA parity with pandas needs the full close history,
+    # projected to the one column it uses, one bar per IST date
+    df = dedupe_daily(load_candle_window("1d", columns=("close",), symbols=symbols, db=db))
+
+    history = {}
+
+    for symbol, timestamp, close in df.itertuples(index=False):
+        history.setdefault(symbol, []).append((timestamp, close))
+
+    return history
+
+
+# ---------------------------
+# Full rebuild (backfill / repair)
+# ---------------------------
+
+def rebuild_breadth_state(symbols=None):
+
+    db = SessionLocal()
+
+    try:
+        history = _load_close_history(db, symbols)
+
+        states = [
+            build_state(symbol, bars)
+            for symbol, bars in history.items()
+        ]
+
+        _save_states(db, states)
+        db.commit()
+
+        print(f"Breadth state rebuilt for {len(states)} symbols")
+
+        return len(states)
+
+    finally:
+        db.close()
+
+
+# ---------------------------
+# Incremental update (ingestion)
+# ---------------------------
+# Mirrors the upsert rule in save_candles: bars on a later IST date
+# than the stored state are appended, the latest bar is replaced only
+# if it falls inside the mutable window (today), older bars are
+# immutable. A later duplicate stamp on the latest bar's IST date
+# replaces it, as the last-wins dedupe of a rebuild would.
+
+def _apply_records(state, records, mutable_from):
+
+    for record in sorted(records, key=lambda r: r["timestamp"]):
+
+        ts = record["timestamp"]
+        last = state["last_timestamp"]
+
+        if last is None or trading_date(ts) > trading_date(last):
+            advance_state(state, ts, record["close"])
+
+        elif trading_date(ts) < trading_date(last):
+            continue
+
+        elif ts > last or (ts == last and ts >= mutable_from):
+            replace_last_bar(state, record["close"])
+            state["last_timestamp"] = ts
+
+    return state
+
+
+def update_breadth_states(db, by_symbol, mutable_from):
+
+    # One read and one upsert for a whole ingestion batch
+    # (symbol -> records); the caller commits
+    rows = (
+        db.query(BreadthState)
+        .filter(BreadthState.symbol.in_(list(by_symbol)))
+        .all()
+    )
+
+    stored = {row.symbol: _state_from_row(row) for row in rows}
+
+    states = [
+        _apply_records(stored[symbol], records, mutable_from)
+        for symbol, records in by_symbol.items()
+        if symbol in stored
+    ]
+
+    # No state yet: build those from their stored history
+    new = [symbol for symbol in by_symbol if symbol not in stored]
+
+    if new:
+        history = _load_close_history(db, new)
+        states += [build_state(symbol, history.get(symbol, [])) for symbol in new]
+
+    _save_states(db, states)
@@ -0,0 +1,156 @@
+from datetime import datetime, time
+from zoneinfo import ZoneInfo
+from sqlalchemy import func, text
+from database import SessionLocal
+from models import MarketCandle
+from market_calendar import trading_days
+
+
+# ---------------------------
+# Config
+# ---------------------------
+
+IST = ZoneInfo("Asia/Kolkata")
+
+# Stored bars a full session should have. "2h" holds Yahoo 60m bars,
+# 09:15 .. 15:15 IST.
+SESSION_BARS = {
+    "1d": 1,
+    "2h": 7,
+}
+
+
+# ---------------------------
+# Stored sessions
+# ---------------------------
+# One row per (symbol, IST date) in the window: how many bars are
+# stored, and whether any of them is malformed (OHLC out of order
+# or non-positive prices).
+
+STORED_DAYS_SQL = """
+    SELECT symbol,
+           (timestamp AT TIME ZONE 'Asia/Kolkata')::date AS day,
+           count(*) AS bars,
+           bool_or(
+               low <= 0
+               OR high < low
+               OR open > high OR open < low
+               OR close > high OR close < low
+           ) AS malformed
+    FROM market_candles
+    WHERE {where}
+    GROUP BY symbol, day
+"""
+
+
+def _stored_days(db, timeframe, start, symbols):
+
+    where = "timeframe = :timeframe AND timestamp >= :since"
+
+    params = {
+        "timeframe": timeframe,
+        "since": datetime.combine(start, time.min, tzinfo=IST),
+    }
+
+    if symbols is not None:
+        where += " AND symbol = ANY(:symbols)"
+        params["symbols"] = list(symbols)
+
+    rows = db.execute(text(STORED_DAYS_SQL.format(where=where)), params).fetchall()
+
+    stored = {}
+
+    for symbol, day, bars, malformed in rows:
+        stored.setdefault(symbol, {})[day] = (bars, malformed)
+
+    return stored
+
+
+def _first_days(db, timeframe, symbols):
+
+    # symbol -> IST date of its first stored bar, one grouped query
+    q = (
+        db.query(MarketCandle.symbol, func.min(MarketCandle.timestamp))
+        .filter(MarketCandle.timeframe == timeframe)
+    )
+
+    if symbols is not None:
+        q = q.filter(MarketCandle.symbol.in_(list(symbols)))
+
+    return {
+        symbol: first.astimezone(IST).date()
+        for symbol, first in q.group_by(MarketCandle.symbol).all()
+    }
+
+
+# ---------------------------
+# Detection
+# ---------------------------
+
+def find_repairs(timeframe, symbols, start, end, db=None):
+
+    # symbol -> sorted (date, reason) pairs that need refetching, for
+    # every session from start to end (IST dates, inclusive) on or
+    # after the symbol's first stored bar. Symbols with nothing stored
+    # from start on are skipped: either never ingested or no longer
+    # served (delisted), they would come back empty on every run, and
+    # the ingestion planner already fetches them from their last bar.
+    expected = trading_days(start, end)
+
+    if not expected:
+        return {}
+
+    own_session = db is None
+
+    if own_session:
+        db = SessionLocal()
+
+    try:
+        stored = _stored_days(db, timeframe, start, symbols)
+        first_days = _first_days(db, timeframe, list(stored)) if stored else {}
+
+    finally:
+        if own_session:
+            db.close()
+
+    want = SESSION_BARS[timeframe]
+
+    repairs = {}
+
+    for symbol in symbols:
+
+        days = stored.get(symbol)
+
+        if not days:
+            continue
+
+        for day in expected:
+
+            # Listed later
+            if day < first_days[symbol]:
+                continue
+
+            bars, malformed = days.get(day, (0, False))
+
+            if bars < want:
+                reason = "missing" if bars == 0 else f"{bars}/{want} bars"
+            elif malformed:
+                reason = "malformed"
+            else:
+                continue
+
+            repairs.setdefault(symbol, []).append((day, reason))
+
+    return repairs
+
+
+def repair_groups(repairs):
+
+    # [(start date, [symbols])]: each symbol is refetched from its
+    # earliest bad session, symbols sharing a start share batches
+    groups = {}
+
+    for symbol, days in repairs.items():
+        groups.setdefault(days[0][0], []).append(symbol)
+
+    return sorted(groups.items())
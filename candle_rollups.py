@@ -0,0 +1,156 @@
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from sqlalchemy import text
+from database import SessionLocal
+from models import MarketCandle
+
+
+# ---------------------------
+# Config
+# ---------------------------
+
+IST = ZoneInfo("Asia/Kolkata")
+
+# Period label per materialized timeframe, as a SQL date expression
+# over the IST trading date `day`. Same buckets as the pandas
+# "W-FRI" / "ME" resamples: weeks end on Friday, months on their
+# last calendar day.
+ROLLUPS = {
+    "1w": "day + ((5 - EXTRACT(ISODOW FROM day)::int + 7) % 7)",
+    "1mo": "(date_trunc('month', day) + interval '1 month - 1 day')::date",
+}
+
+
+# ---------------------------
+# Periods
+# ---------------------------
+
+def period_start(timeframe, day):
+
+    if timeframe == "1w":
+        week_end = day + timedelta(days=(4 - day.weekday()) % 7)
+        return week_end - timedelta(days=6)
+
+    return day.replace(day=1)
+
+
+# ---------------------------
+# Aggregation
+# ---------------------------
+# One INSERT ... SELECT per timeframe. Daily bars are first reduced to
+# one per IST trading date (Yahoo's duplicate 00:00 / 18:30 UTC
+# candles, last wins), then grouped by period. The bar is stored at
+# IST midnight of the period label, so its IST date is the label.
+# Ids are built from md5(), which every Postgres version has, rather
+# than gen_random_uuid() (core only from 13); existing rows keep theirs.
+
+def _rollup_sql(timeframe, since, symbols):
+
+    where = "timeframe = '1d'"
+    params = {"timeframe": timeframe}
+
+    if since is not None:
+        where += " AND timestamp >= :since"
+        params["since"] = datetime.combine(since, time.min, tzinfo=IST)
+
+    if symbols is not None:
+        where += " AND symbol = ANY(:symbols)"
+        params["symbols"] = list(symbols)
+
+    sql = f"""
+        WITH daily AS (
+            SELECT DISTINCT ON (symbol, day)
+                   symbol, day, open, high, low, close, volume
+            FROM (
+                SELECT symbol, timestamp, open, high, low, close, volume,
+                       (timestamp AT TIME ZONE 'Asia/Kolkata')::date AS day
+                FROM market_candles
+                WHERE {where}
+            ) d
+            ORDER BY symbol, day, timestamp DESC
+        ),
+        periods AS (
+            SELECT *, {ROLLUPS[timeframe]} AS label
+            FROM daily
+        )
+        INSERT INTO market_candles
+            (id, symbol, timeframe, timestamp, open, high, low, close, volume)
+        SELECT
+            md5(random()::text || clock_timestamp()::text || symbol)::uuid,
+            symbol,
+            :timeframe,
+            label::timestamp AT TIME ZONE 'Asia/Kolkata',
+            (array_agg(open ORDER BY day))[1],
+            max(high),
+            min(low),
+            (array_agg(close ORDER BY day DESC))[1],
+            sum(volume)
+        FROM periods
+        GROUP BY symbol, label
+        ON CONFLICT (symbol, timeframe, timestamp) DO UPDATE SET
+            open = EXCLUDED.open,
+            high = EXCLUDED.high,
+            low = EXCLUDED.low,
+            close = EXCLUDED.close,
+            volume = EXCLUDED.volume
+    """
+
+    return sql, params
+
+
+def rollup_candles(timeframe, since=None, symbols=None, db=None):
+
+    sql, params = _rollup_sql(timeframe, since, symbols)
+
+    own_session = db is None
+
+    if own_session:
+        db = SessionLocal()
+
+    try:
+        result = db.execute(text(sql), params)
+        db.commit()
+
+        return result.rowcount
+
+    finally:
+        if own_session:
+            db.close()
+
+
+def refresh_rollups(days=7):
+
+    # Every period touched by the last `days` daily bars is rebuilt
+    # whole; a timeframe with no bars yet is backfilled.
+    db = SessionLocal()
+
+    try:
+        today = datetime.now(IST).date()
+
+        for timeframe in ROLLUPS:
+
+            empty = (
+                db.query(MarketCandle.id)
+                .filter(MarketCandle.timeframe == timeframe)
+                .first()
+            ) is None
+
+            since = None if empty else period_start(timeframe, today - timedelta(days=days))
+
+            count = rollup_candles(timeframe, since=since, db=db)
+
+            print(f"{timeframe} candles rolled up: {count}")
+
+    finally:
+        db.close()
+
+
+def seed_rollups(symbols):
+
+    # Whole history of symbols that just got their first daily bars;
+    # refresh_rollups only covers the recent periods
+    for timeframe in ROLLUPS:
+
+        count = rollup_candles(timeframe, symbols=symbols)
+
+        print(f"{timeframe} candles seeded for {len(symbols)} symbols: {count}")
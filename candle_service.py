@@ -1,9 +1,79 @@
+import io
+import os
+import re
+from zoneinfo import ZoneInfo
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from models import MarketCandle
+import numpy as np
 import pandas as pd
 
 
+CANDLE_COLUMNS = ("open", "high", "low", "close", "volume")
+
+# "copy" streams windows through COPY ... TO STDOUT, "query" fetches
+# them as rows through the driver
+CANDLE_READER = os.getenv("CANDLE_READER", "copy")
+
+# Timestamps leave Postgres as epoch microseconds, so parsing the
+# COPY stream never touches a date parser
+EPOCH_US = "(EXTRACT(EPOCH FROM timestamp) * 1000000)::bigint AS timestamp"
+
+
+# ---------------------------
+# Trading dates
+# ---------------------------
+# Yahoo can return one daily candle twice, stamped 00:00 and 18:30
+# UTC. Both fall on the same IST trading date, so every daily reader
+# keeps one bar per (symbol, IST date), the latest one. IST has no
+# DST, so the date is a fixed offset from the epoch.
+
+IST = ZoneInfo("Asia/Kolkata")
+
+IST_OFFSET_US = 19_800_000_000
+DAY_US = 86_400_000_000
+
+
+def ist_day(ts_us):
+    # Epoch microseconds (UTC) -> IST days since the epoch
+    return (ts_us + IST_OFFSET_US) // DAY_US
+
+
+def trading_date(ts):
+    return ts.astimezone(IST).date()
+
+
+def last_bar_per_day(codes, ts_us):
+
+    # Row mask over arrays ordered by symbol, timestamp: True on the
+    # last row of each (symbol, IST date) run
+    day = ist_day(ts_us)
+
+    keep = np.ones(len(ts_us), dtype=bool)
+    keep[:-1] = (codes[1:] != codes[:-1]) | (day[1:] != day[:-1])
+
+    return keep
+
+
+def dedupe_daily(df):
+
+    # Frame variant: rows in any order, "symbol" column optional
+    if df.empty:
+        return df
+
+    df = df.sort_values([c for c in ("symbol", "timestamp") if c in df.columns], kind="stable")
+
+    ts = pd.to_datetime(df["timestamp"], utc=True).dt.as_unit("us").astype("int64")
+
+    if "symbol" in df.columns:
+        codes = pd.factorize(df["symbol"])[0]
+    else:
+        codes = np.zeros(len(df), dtype=np.int64)
+
+    return df[last_bar_per_day(codes, ts.to_numpy())]
+
+
 def get_candles(symbol: str, timeframe: str, limit: int = 100):
     db: Session = SessionLocal()
 
@@ -40,4 +110,195 @@ def get_candles(symbol: str, timeframe: str, limit: int = 100):
         return df
 
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# ---------------------------
+# Windowed bulk reader
+# ---------------------------
+# Last `bars` candles per symbol (all of them when bars is None),
+# optionally only those stamped at or after `since`, projected to the
+# requested columns and returned as one frame ordered by symbol,
+# timestamp. No ORM objects are built.
+
+def _window_sql(timeframe, bars, columns, symbols, epoch=False, since=None):
+
+    for c in columns:
+        if c not in CANDLE_COLUMNS:
+            raise ValueError(f"Unknown candle column: {c}")
+
+    select = ", ".join(["symbol", "timestamp", *columns])
+    outer = ", ".join(["symbol", EPOCH_US, *columns]) if epoch else select
+
+    where = "timeframe = :timeframe"
+    params = {"timeframe": timeframe}
+
+    if symbols is not None:
+        where += " AND symbol = ANY(:symbols)"
+        params["symbols"] = list(symbols)
+
+    if since is not None:
+        where += " AND timestamp >= :since"
+        params["since"] = since
+
+    if bars is None:
+        sql = f"""
+            SELECT {outer}
+            FROM market_candles
+            WHERE {where}
+            ORDER BY symbol, timestamp
+        """
+
+    else:
+        sql = f"""
+            SELECT {outer}
+            FROM (
+                SELECT {select},
+                       ROW_NUMBER() OVER (
+                           PARTITION BY symbol
+                           ORDER BY timestamp DESC
+                       ) AS rn
+                FROM market_candles
+                WHERE {where}
+            ) w
+            WHERE rn <= :bars
+            ORDER BY symbol, timestamp
+        """
+        params["bars"] = int(bars)
+
+    return sql, params
+
+
+def load_candle_window(
+    timeframe,
+    bars=None,
+    columns=CANDLE_COLUMNS,
+    symbols=None,
+    db=None,
+    reader=None,
+    since=None
+):
+
+    if (reader or CANDLE_READER) == "copy":
+
+        arrays = read_candle_arrays(timeframe, bars, columns, symbols, db, since)
+
+        return pd.DataFrame({
+            "symbol": arrays["symbols"][arrays["codes"]],
+            "timestamp": pd.to_datetime(arrays["timestamp"], unit="us", utc=True),
+            **{c: arrays[c] for c in columns},
+        })
+
+    sql, params = _window_sql(timeframe, bars, columns, symbols, since=since)
+
+    own_session = db is None
+
+    if own_session:
+        db = SessionLocal()
+
+    try:
+        rows = db.execute(text(sql), params).fetchall()
+
+    finally:
+        if own_session:
+            db.close()
+
+    return pd.DataFrame(rows, columns=["symbol", "timestamp", *columns])
+
+
+# ---------------------------
+# COPY bulk reader
+# ---------------------------
+# Same window as load_candle_window, streamed out of Postgres with
+# COPY (SELECT ...) TO STDOUT as CSV and parsed straight into typed
+# arrays, ordered by symbol, timestamp:
+#
+#   symbols    distinct symbol names
+#   codes      int32 index into symbols, one per row
+#   timestamp  int64 epoch microseconds (UTC)
+#   open .. close float64, volume int64
+#
+# Rows of one symbol are contiguous, so np.diff(codes) marks the
+# symbol boundaries.
+
+COLUMN_DTYPES = {
+    "open": np.float64,
+    "high": np.float64,
+    "low": np.float64,
+    "close": np.float64,
+    "volume": np.int64,
+}
+
+
+def _pyformat(sql):
+    # :name -> %(name)s, leaving :: casts alone
+    return re.sub(r"(?<!:):(\w+)", r"%(\1)s", sql)
+
+
+def parse_candle_copy(buf, columns=CANDLE_COLUMNS):
+
+    names = ["symbol", "timestamp", *columns]
+
+    # An empty window streams no bytes at all
+    if not buf.getvalue():
+        buf = io.StringIO(",".join(names))
+        header = 0
+    else:
+        header = None
+
+    df = pd.read_csv(
+        buf,
+        header=header,
+        names=names,
+        dtype={
+            "symbol": "category",
+            "timestamp": np.int64,
+            **{c: COLUMN_DTYPES[c] for c in columns},
+        },
+        engine="c",
+        # Postgres writes the shortest exact repr; read it back exactly
+        float_precision="round_trip",
+    )
+
+    symbol = df["symbol"].cat
+
+    arrays = {
+        "symbols": symbol.categories.to_numpy(dtype=object),
+        "codes": symbol.codes.to_numpy().astype(np.int32),
+        "timestamp": df["timestamp"].to_numpy(),
+    }
+
+    for c in columns:
+        arrays[c] = df[c].to_numpy()
+
+    return arrays
+
+
+def read_candle_arrays(timeframe, bars=None, columns=CANDLE_COLUMNS, symbols=None, db=None, since=None):
+
+    sql, params = _window_sql(timeframe, bars, columns, symbols, epoch=True, since=since)
+
+    own_session = db is None
+
+    if own_session:
+        db = SessionLocal()
+
+    try:
+        buf = io.BytesIO()
+
+        cursor = db.connection().connection.cursor()
+
+        try:
+            query = cursor.mogrify(_pyformat(sql), params).decode()
+            cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", buf)
+
+        finally:
+            cursor.close()
+
+    finally:
+        if own_session:
+            db.close()
+
+    buf.seek(0)
+
+    return parse_candle_copy(buf, columns)
@@ -0,0 +1,329 @@
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import pandas as pd
+import yfinance as yf
+from candle_service import load_candle_window
+
+
+# ---------------------------
+# Config
+# ---------------------------
+# CANDLE_SOURCE picks the provider ingestion, repair and metadata
+# talk to: "yfinance" (default) or "replay" for local fixtures.
+
+CANDLE_SOURCE = os.getenv("CANDLE_SOURCE", "yfinance")
+
+# Tickers one yfinance download call fetches at a time. Calls run
+# side by side (one per ingestion worker), so the provider sees up
+# to INGEST_WORKERS * YF_THREADS requests in flight.
+YF_THREADS = int(os.getenv("YF_THREADS", 4))
+
+REPLAY_PATH = os.getenv("REPLAY_PATH", "data/replay")
+
+# Per download call, plus up to REPLAY_JITTER_MS of noise
+REPLAY_LATENCY_MS = float(os.getenv("REPLAY_LATENCY_MS", 0))
+REPLAY_JITTER_MS = float(os.getenv("REPLAY_JITTER_MS", 0))
+
+# Share of download calls that raise, and of symbols that come back
+# empty from an otherwise successful call
+REPLAY_ERROR_RATE = float(os.getenv("REPLAY_ERROR_RATE", 0))
+REPLAY_MISSING_RATE = float(os.getenv("REPLAY_MISSING_RATE", 0))
+
+REPLAY_SEED = os.getenv("REPLAY_SEED")
+
+IST = ZoneInfo("Asia/Kolkata")
+
+OHLCV = ["Open", "High", "Low", "Close", "Volume"]
+
+
+# ---------------------------
+# Interface
+# ---------------------------
+# download() returns symbol -> OHLCV frame (columns Open .. Volume,
+# tz-aware timestamp index) for the symbols that returned data.
+# `start` (a date) fetches from that day on, else the trailing
+# `period` ("7d", "730d", "max").
+
+class CandleSource(ABC):
+
+    name = "base"
+
+    @abstractmethod
+    def download(self, symbols, interval, period=None, start=None):
+        ...
+
+    @abstractmethod
+    def info(self, symbol):
+        # Company metadata: at least "sector" and "industry"
+        ...
+
+
+# ---------------------------
+# yfinance
+# ---------------------------
+
+class YFinanceSource(CandleSource):
+
+    name = "yfinance"
+
+    # yf.download resets module-level result dicts on every call, so
+    # two overlapping calls clobber each other. Ticker.history keeps
+    # its result local: each call fans its tickers out over its own
+    # pool, and concurrent calls share only yfinance's HTTP session,
+    # as the tickers of one yf.download do.
+
+    def __init__(self, threads=YF_THREADS):
+
+        if threads < 1:
+            raise ValueError(f"YF_THREADS must be at least 1: {threads}")
+
+        self.threads = threads
+
+    def _history(self, symbol, interval, span):
+
+        df = yf.Ticker(symbol).history(
+            interval=interval,
+            auto_adjust=False,
+            actions=False,
+            **span
+        )
+
+        # Failed tickers come back empty, possibly without columns
+        if df.empty:
+            return df
+
+        # yf.download drops the exchange timezone from daily bars;
+        # keep the stored stamps the same
+        if not interval.endswith(("m", "h")):
+            df.index = df.index.tz_localize(None)
+
+        return df.dropna(subset=["Open", "High", "Low", "Close"])
+
+    def download(self, symbols, interval, period=None, start=None):
+
+        span = {"start": start.isoformat()} if start is not None else {"period": period}
+
+        with ThreadPoolExecutor(max_workers=min(self.threads, len(symbols) or 1)) as pool:
+            results = list(pool.map(lambda symbol: self._history(symbol, interval, span), symbols))
+
+        return {
+            symbol: df
+            for symbol, df in zip(symbols, results)
+            if not df.empty
+        }
+
+    def info(self, symbol):
+        return yf.Ticker(symbol).info
+
+
+# ---------------------------
+# Replay
+# ---------------------------
+# Serves fixtures from disk, one file per symbol and interval:
+#
+#   <path>/<interval>/<symbol>.parquet  (or .csv)
+#   <path>/metadata.csv                 symbol, sector, industry
+#
+# with columns timestamp, open, high, low, close, volume (any case).
+# Naive timestamps are read as UTC. A trailing `period` counts back
+# from the fixture's last bar, so old fixtures replay the same way on
+# any day. Parquet needs pyarrow; CSV needs nothing extra.
+
+class ReplaySource(CandleSource):
+
+    name = "replay"
+
+    def __init__(
+        self,
+        path=REPLAY_PATH,
+        latency_ms=REPLAY_LATENCY_MS,
+        jitter_ms=REPLAY_JITTER_MS,
+        error_rate=REPLAY_ERROR_RATE,
+        missing_rate=REPLAY_MISSING_RATE,
+        seed=REPLAY_SEED
+    ):
+
+        for rate in (error_rate, missing_rate):
+            if not 0 <= rate <= 1:
+                raise ValueError(f"Replay rates must be between 0 and 1: {rate}")
+
+        self.path = path
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.missing_rate = missing_rate
+
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+
+        self._metadata = None
+
+    def _roll(self):
+        with self._random_lock:
+            return self._random.random()
+
+    def _fixture(self, symbol, interval):
+
+        key = (symbol, interval)
+
+        with self._cache_lock:
+            if key in self._cache:
+                return self._cache[key]
+
+        df = None
+
+        for ext, reader in ((".parquet", pd.read_parquet), (".csv", pd.read_csv)):
+
+            file = os.path.join(self.path, interval, symbol + ext)
+
+            if os.path.exists(file):
+                df = reader(file)
+                break
+
+        if df is not None:
+
+            df = df.rename(columns={c: c.capitalize() for c in df.columns})
+            df["Timestamp"] = pd.to_datetime(df["Timestamp"], utc=True)
+
+            df = df.set_index("Timestamp").sort_index()[OHLCV]
+            df.index.name = None
+
+        with self._cache_lock:
+            self._cache[key] = df
+
+        return df
+
+    def _window(self, df, period, start):
+
+        if start is not None:
+            since = datetime.combine(start, datetime.min.time(), tzinfo=IST)
+            return df[df.index >= since]
+
+        if period in (None, "max"):
+            return df
+
+        if not period.endswith("d"):
+            raise ValueError(f"Unsupported replay period: {period}")
+
+        since = df.index[-1] - timedelta(days=int(period[:-1]))
+
+        return df[df.index > since]
+
+    def download(self, symbols, interval, period=None, start=None):
+
+        delay = self.latency_ms + self._roll() * self.jitter_ms
+
+        if delay:
+            time.sleep(delay / 1000)
+
+        if self._roll() < self.error_rate:
+            raise ConnectionError(f"Injected replay failure for {len(symbols)} symbols")
+
+        frames = {}
+
+        for symbol in symbols:
+
+            df = self._fixture(symbol, interval)
+
+            if df is None or df.empty:
+                continue
+
+            if self._roll() < self.missing_rate:
+                continue
+
+            g = self._window(df, period, start)
+
+            if not g.empty:
+                frames[symbol] = g
+
+        return frames
+
+    def _load_metadata(self):
+
+        # symbol -> metadata dict, read once; empty cells become None
+        # like missing keys in yfinance's info
+        file = os.path.join(self.path, "metadata.csv")
+
+        if not os.path.exists(file):
+            return {}
+
+        df = pd.read_csv(file)
+        df = df.astype(object).where(df.notna(), None)
+
+        return {row["symbol"]: row for row in df.to_dict("records")}
+
+    def info(self, symbol):
+
+        with self._cache_lock:
+
+            if self._metadata is None:
+                self._metadata = self._load_metadata()
+
+            return dict(self._metadata.get(symbol, {}))
+
+
+def export_replay_fixtures(path, timeframe="1d", interval="1d", symbols=None):
+
+    # Writes stored candles as replay CSVs, for reproducible runs
+    df = load_candle_window(timeframe, symbols=symbols)
+
+    folder = os.path.join(path, interval)
+    os.makedirs(folder, exist_ok=True)
+
+    count = 0
+
+    for symbol, g in df.groupby("symbol"):
+        g.drop(columns="symbol").to_csv(os.path.join(folder, f"{symbol}.csv"), index=False)
+        count += 1
+
+    print(f"Replay fixtures written: {count} symbols to {folder}")
+
+    return count
+
+
+# ---------------------------
+# Selection
+# ---------------------------
+
+SOURCES = {
+    "yfinance": YFinanceSource,
+    "replay": ReplaySource,
+}
+
+_SOURCE = None
+_SOURCE_LOCK = threading.Lock()
+
+
+def get_candle_source():
+
+    global _SOURCE
+
+    with _SOURCE_LOCK:
+
+        if _SOURCE is None:
+
+            if CANDLE_SOURCE not in SOURCES:
+                raise ValueError(f"Unknown CANDLE_SOURCE: {CANDLE_SOURCE}")
+
+            _SOURCE = SOURCES[CANDLE_SOURCE]()
+
+        return _SOURCE
+
+
+def set_candle_source(source):
+
+    # Point ingestion at another provider, e.g. a ReplaySource built
+    # with its own fixtures and fault settings
+    global _SOURCE
+
+    with _SOURCE_LOCK:
+        _SOURCE = source
@@ -0,0 +1,363 @@
+from datetime import datetime, time
+from zoneinfo import ZoneInfo
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from database import SessionLocal
+from models import IndicatorValue
+from candle_service import load_candle_window, dedupe_daily
+from indicators import (
+    EMA_SPANS,
+    ST_PERIOD,
+    ST_NA,
+    rolling_mean,
+    true_range,
+    supertrend_bands,
+    supertrend_events,
+    carry_events,
+)
+
+
+# ---------------------------
+# Config
+# ---------------------------
+
+STORE_TIMEFRAMES = ("1d", "2h")
+
+IST = ZoneInfo("Asia/Kolkata")
+
+SAVE_CHUNK = 5000
+
+VALUE_COLUMNS = [
+    "bar_index",
+    "close",
+    *[f"ema{span}" for span in EMA_SPANS],
+    "tr",
+    "atr",
+    "st_upper",
+    "st_lower",
+    "supertrend",
+    "st_direction",
+]
+
+
+# ---------------------------
+# Bars
+# ---------------------------
+
+def _bars(df, timeframe):
+
+    # One bar per IST trading date; drops Yahoo's duplicate
+    # 00:00 / 18:30 UTC daily candles (last wins)
+    if timeframe == "1d":
+        return dedupe_daily(df)
+
+    return df.sort_values("timestamp")
+
+
+def _bar_start(timeframe, ts):
+
+    # First timestamp that can belong to the same bar as `ts`
+    if timeframe == "1d":
+        return datetime.combine(ts.astimezone(IST).date(), time.min, tzinfo=IST)
+
+    return ts
+
+
+# ---------------------------
+# Recurrences
+# ---------------------------
+# `seed` is the stored rows right before `bars`, oldest first (up to
+# ST_PERIOD of them, for the ATR window). Every series continues from
+# the last seed row exactly as if the whole history had been computed
+# in one go: ewm(adjust=False) restarts from the stored EMA, and the
+# supertrend carry restarts from the stored direction / value.
+
+def _num(value):
+    return np.nan if value is None else value
+
+
+def fold_indicators(bars, seed=None):
+
+    seed = seed or []
+    last = seed[-1] if seed else None
+
+    high = bars["high"].to_numpy(dtype=np.float64)
+    low = bars["low"].to_numpy(dtype=np.float64)
+    close = bars["close"].to_numpy(dtype=np.float64)
+
+    start = last["bar_index"] + 1 if last else 0
+
+    out = pd.DataFrame({
+        "timestamp": bars["timestamp"].to_numpy(),
+        "bar_index": np.arange(start, start + len(close)),
+        "close": close,
+    })
+
+    for span in EMA_SPANS:
+
+        if last is None:
+            ema = pd.Series(close).ewm(span=span, adjust=False).mean().to_numpy()
+        else:
+            series = np.concatenate([[last[f"ema{span}"]], close])
+            ema = pd.Series(series).ewm(span=span, adjust=False).mean().to_numpy()[1:]
+
+        out[f"ema{span}"] = ema
+
+    def after(key, values):
+        head = _num(last[key]) if last else np.nan
+        return np.concatenate([[head], values[:-1]])
+
+    tr = true_range(high, low, after("close", close))
+
+    past_tr = np.array([_num(r["tr"]) for r in seed[-(ST_PERIOD - 1):]], dtype=np.float64)
+    atr = rolling_mean(np.concatenate([past_tr, tr]), ST_PERIOD)[len(past_tr):]
+
+    upper, lower = supertrend_bands(high, low, atr)
+
+    event, code, value = supertrend_events(
+        close, after("st_upper", upper), after("st_lower", lower), upper, lower
+    )
+
+    # The stored state enters as a leading event
+    supertrend, direction = carry_events(
+        np.concatenate([[True], event]),
+        np.concatenate([[last["st_direction"] if last else ST_NA], code]).astype(np.int8),
+        np.concatenate([[_num(last["supertrend"]) if last else np.nan], value])
+    )
+
+    out["tr"] = tr
+    out["atr"] = atr
+    out["st_upper"] = upper
+    out["st_lower"] = lower
+    out["supertrend"] = supertrend[1:]
+    out["st_direction"] = direction[1:]
+
+    return out
+
+
+# ---------------------------
+# Persistence
+# ---------------------------
+
+def _row_dict(row):
+    return {c: getattr(row, c) for c in VALUE_COLUMNS}
+
+
+def _insert_rows(db, timeframe, frames):
+
+    # frames: symbol -> indicator frame
+    records = []
+
+    for symbol, frame in frames.items():
+        frame = frame.astype(object).where(frame.notna(), None)
+        records += frame.assign(symbol=symbol, timeframe=timeframe).to_dict("records")
+
+    for i in range(0, len(records), SAVE_CHUNK):
+
+        stmt = insert(IndicatorValue).values(records[i:i + SAVE_CHUNK])
+
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["symbol", "timeframe", "timestamp"],
+            set_={c: stmt.excluded[c] for c in VALUE_COLUMNS}
+        )
+
+        db.execute(stmt)
+
+
+def _replace_rows(db, symbol, timeframe, frame, cutoff=None):
+
+    q = db.query(IndicatorValue).filter(
+        IndicatorValue.symbol == symbol,
+        IndicatorValue.timeframe == timeframe
+    )
+
+    if cutoff is not None:
+        q = q.filter(IndicatorValue.timestamp >= cutoff)
+
+    q.delete(synchronize_session=False)
+
+    _insert_rows(db, timeframe, {symbol: frame})
+
+
+# ---------------------------
+# Incremental update (ingestion)
+# ---------------------------
+# One ingestion batch at a time: per symbol, everything from the bar
+# holding its earliest written record onwards is recomputed, seeded
+# from the stored rows just before it. Symbols with nothing stored
+# before their cutoff are rebuilt from their full history. Each step
+# is one statement for the whole batch, joined against a
+# (symbol, cutoff) list; a NULL cutoff means the full history.
+# The caller commits.
+
+CUTOFFS = """
+    unnest(CAST(:symbols AS text[]), CAST(:cutoffs AS timestamptz[]))
+        AS c(symbol, cutoff)
+"""
+
+SEED_SQL = f"""
+    SELECT symbol, {", ".join(VALUE_COLUMNS)}
+    FROM (
+        SELECT v.*,
+               ROW_NUMBER() OVER (
+                   PARTITION BY v.symbol
+                   ORDER BY v.timestamp DESC
+               ) AS rn
+        FROM indicator_values v
+        JOIN {CUTOFFS} ON v.symbol = c.symbol
+        WHERE v.timeframe = :timeframe
+          AND v.timestamp < c.cutoff
+    ) w
+    WHERE rn <= :period
+    ORDER BY symbol, timestamp
+"""
+
+CANDLES_SQL = f"""
+    SELECT m.symbol, m.timestamp, m.high, m.low, m.close
+    FROM market_candles m
+    JOIN {CUTOFFS} ON m.symbol = c.symbol
+    WHERE m.timeframe = :timeframe
+      AND (c.cutoff IS NULL OR m.timestamp >= c.cutoff)
+    ORDER BY m.symbol, m.timestamp
+"""
+
+DELETE_SQL = f"""
+    DELETE FROM indicator_values v
+    USING {CUTOFFS}
+    WHERE v.symbol = c.symbol
+      AND v.timeframe = :timeframe
+      AND (c.cutoff IS NULL OR v.timestamp >= c.cutoff)
+"""
+
+
+def _cutoff_params(timeframe, cutoffs):
+    return {
+        "timeframe": timeframe,
+        "symbols": list(cutoffs),
+        "cutoffs": list(cutoffs.values()),
+    }
+
+
+def update_indicators(db, timeframe, by_symbol):
+
+    # by_symbol: symbol -> candle records just written
+    if timeframe not in STORE_TIMEFRAMES:
+        return
+
+    cutoffs = {
+        symbol: _bar_start(timeframe, min(r["timestamp"] for r in records))
+        for symbol, records in by_symbol.items()
+        if records
+    }
+
+    if not cutoffs:
+        return
+
+    seeds = {}
+
+    rows = db.execute(
+        text(SEED_SQL),
+        {**_cutoff_params(timeframe, cutoffs), "period": ST_PERIOD}
+    ).fetchall()
+
+    for row in rows:
+        seeds.setdefault(row.symbol, []).append(_row_dict(row))
+
+    # Nothing stored yet: build the symbol's full history
+    for symbol in cutoffs:
+        if symbol not in seeds:
+            cutoffs[symbol] = None
+
+    params = _cutoff_params(timeframe, cutoffs)
+
+    candles = pd.DataFrame(
+        db.execute(text(CANDLES_SQL), params).fetchall(),
+        columns=["symbol", "timestamp", "high", "low", "close"]
+    )
+
+    frames = {
+        symbol: fold_indicators(_bars(g, timeframe), seeds.get(symbol))
+        for symbol, g in candles.groupby("symbol")
+    }
+
+    db.execute(text(DELETE_SQL), params)
+
+    _insert_rows(db, timeframe, frames)
+
+
+def rebuild_indicator_store(timeframes=STORE_TIMEFRAMES, symbols=None):
+
+    db = SessionLocal()
+
+    try:
+        count = 0
+
+        for timeframe in timeframes:
+
+            df = load_candle_window(
+                timeframe,
+                columns=("high", "low", "close"),
+                symbols=symbols,
+                db=db
+            )
+
+            for symbol, g in df.groupby("symbol"):
+                _replace_rows(db, symbol, timeframe, fold_indicators(_bars(g, timeframe)))
+                count += 1
+
+            db.commit()
+
+        print(f"Indicator store rebuilt: {count} series")
+
+        return count
+
+    finally:
+        db.close()
+
+
+# ---------------------------
+# Lookups
+# ---------------------------
+# Last `bars` stored rows per symbol, ordered by symbol, timestamp.
+
+def load_indicator_tail(timeframe, bars, symbols=None, db=None):
+
+    select = ", ".join(["symbol", "timestamp", *VALUE_COLUMNS])
+
+    where = "timeframe = :timeframe"
+    params = {"timeframe": timeframe, "bars": int(bars)}
+
+    if symbols is not None:
+        where += " AND symbol = ANY(:symbols)"
+        params["symbols"] = list(symbols)
+
+    sql = f"""
+        SELECT {select}
+        FROM (
+            SELECT {select},
+                   ROW_NUMBER() OVER (
+                       PARTITION BY symbol
+                       ORDER BY timestamp DESC
+                   ) AS rn
+            FROM indicator_values
+            WHERE {where}
+        ) w
+        WHERE rn <= :bars
+        ORDER BY symbol, timestamp
+    """
+
+    own_session = db is None
+
+    if own_session:
+        db = SessionLocal()
+
+    try:
+        rows = db.execute(text(sql), params).fetchall()
+
+    finally:
+        if own_session:
+            db.close()
+
+    return pd.DataFrame(rows, columns=["symbol", "timestamp", *VALUE_COLUMNS])
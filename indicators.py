@@ -0,0 +1,116 @@
+import numpy as np
+
+
+# ---------------------------
+# Config
+# ---------------------------
+
+EMA_SPANS = (5, 20, 55, 80, 200)
+
+ST_PERIOD = 10
+ST_MULTIPLIER = 2.1
+
+# Supertrend direction codes (int8)
+ST_UP = 1
+ST_DOWN = -1
+ST_NA = 0
+
+ST_LABELS = {ST_UP: "UP", ST_DOWN: "DOWN", ST_NA: "NA"}
+
+
+# ---------------------------
+# Array helpers
+# ---------------------------
+# All helpers work over the last axis: one series, or a
+# symbols x bars matrix.
+
+def shift_right(a):
+    out = np.full_like(a, np.nan)
+    out[..., 1:] = a[..., :-1]
+    return out
+
+
+def rolling_mean(a, window):
+
+    # Mean over the last `window` bars; NaN unless all of them exist
+    valid = ~np.isnan(a)
+
+    zeros = np.zeros(a.shape[:-1] + (1,))
+    sums = np.concatenate([zeros, np.cumsum(np.where(valid, a, 0.0), axis=-1)], axis=-1)
+    counts = np.concatenate([zeros, np.cumsum(valid, axis=-1)], axis=-1)
+
+    out = np.full_like(a, np.nan)
+
+    full = (counts[..., window:] - counts[..., :-window]) == window
+    means = (sums[..., window:] - sums[..., :-window]) / window
+
+    out[..., window - 1:] = np.where(full, means, np.nan)
+
+    return out
+
+
+def true_range(high, low, prev_close):
+
+    # fmax skips the missing previous close on the first bar
+    return np.fmax(
+        np.fmax(high - low, np.abs(high - prev_close)),
+        np.abs(low - prev_close)
+    )
+
+
+def supertrend_bands(high, low, atr, multiplier=ST_MULTIPLIER):
+
+    mid = (high + low) / 2
+
+    return mid + multiplier * atr, mid - multiplier * atr
+
+
+def supertrend_events(close, prev_upper, prev_lower, upper, lower):
+
+    # Close above the previous upper band -> UP at the lower band,
+    # below the previous lower band -> DOWN at the upper band
+    up = close > prev_upper
+    down = ~up & (close < prev_lower)
+
+    code = np.where(up, ST_UP, np.where(down, ST_DOWN, ST_NA)).astype(np.int8)
+    value = np.where(up, lower, np.where(down, upper, np.nan))
+
+    return up | down, code, value
+
+
+def carry_events(event, code, value):
+
+    # Forward fill of the latest event at or before each bar
+    positions = np.arange(event.shape[-1])
+    last_event = np.maximum.accumulate(np.where(event, positions, 0), axis=-1)
+
+    return (
+        np.take_along_axis(value, last_event, axis=-1),
+        np.take_along_axis(code, last_event, axis=-1)
+    )
+
+
+# ---------------------------
+# Supertrend
+# ---------------------------
+# Matrices are left-padded with NaN. Returns values and int8
+# direction codes. A bar either crosses the previous band or carries
+# the previous state, so both outputs are a forward fill of the
+# crossing events.
+
+def supertrend_arrays(high, low, close, period=ST_PERIOD, multiplier=ST_MULTIPLIER):
+
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+
+    tr = true_range(high, low, shift_right(close))
+    atr = rolling_mean(tr, period)
+
+    upper, lower = supertrend_bands(high, low, atr, multiplier)
+
+    event, code, value = supertrend_events(
+        close, shift_right(upper), shift_right(lower), upper, lower
+    )
+
+    return carry_events(event, code, value)
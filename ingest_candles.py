@@ -1,5 +1,9 @@
-import yfinance as yf
+import csv
+import io
+import os
+import uuid
 from datetime import datetime, timezone, timedelta
+from sqlalchemy import text
 from sqlalchemy.dialects.postgresql import insert
 from database import SessionLocal
 from models import MarketCandle
@@ -8,6 +12,16 @@ from database import SessionLocal
 from ingestion_logs import log_ingestion
 from market_calendar import is_market_day
 from telegram_alert import send_telegram_alert
+from breadth_state import update_breadth_states, rebuild_breadth_state
+from breadth_engine import invalidate_breadth_cache
+from indicator_store import update_indicators, rebuild_indicator_store
+from breadth_history import update_breadth_history
+from price_panel import update_price_panel
+from candle_rollups import refresh_rollups, seed_rollups
+from ingestion_executor import IngestionExecutor
+from candle_sources import get_candle_source
+from ingestion_planner import plan_ingestion, latest_session
+from candle_repair import find_repairs, repair_groups
 import pytz
 from zoneinfo import ZoneInfo
 from telegram_alert import send_telegram_alert
@@ -28,54 +42,72 @@ TIMEFRAMES = {
 }
 
 
+# Tickers per download call, as in data_fetcher
+BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 100))
+
+# "copy" stages each batch with COPY and merges it in one statement,
+# "insert" sends multi-row INSERT ... ON CONFLICT statements
+CANDLE_WRITER = os.getenv("CANDLE_WRITER", "copy")
+
+# Rows per upsert statement (8 bind params each)
+UPSERT_CHUNK = 5000
+
+
 # ----------------------------
-# CORE SAVE FUNCTION
+# DOWNLOAD
 # ----------------------------
 
-def save_candles(symbol, timeframe, interval, period):
+def download_batch(symbols, interval, period=None, start=None):
 
-    df = yf.download(
-        symbol,
-        interval=interval,
-        period=period,
-        auto_adjust=False,
-        threads=True
-    )
+    # symbol -> OHLCV frame from the configured candle source
+    return get_candle_source().download(symbols, interval, period=period, start=start)
 
-    if df.empty:
-        print(f"No data for {symbol} {timeframe}")
-        return
 
-    if hasattr(df.columns, "levels"):
-        df.columns = df.columns.get_level_values(0)
+def frame_records(symbol, timeframe, df):
 
-    db = SessionLocal()
+    records = []
 
-    try:
-        today_utc = datetime.now(timezone.utc).date()
+    for timestamp, row in df.iterrows():
+        ts = timestamp.to_pydatetime().astimezone(timezone.utc)
 
-        records = []
+        record = {
+            "symbol": symbol,
+            "timeframe": timeframe,
+            "timestamp": ts,
+            "open": float(row["Open"]),
+            "high": float(row["High"]),
+            "low": float(row["Low"]),
+            "close": float(row["Close"]),
+            # NaN volume (x != x) on some index bars
+            "volume": int(row["Volume"]) if row["Volume"] == row["Volume"] else 0,
+        }
 
-        for timestamp, row in df.iterrows():
-            ts = timestamp.to_pydatetime().astimezone(timezone.utc)
+        records.append(record)
 
-            record = {
-                "symbol": symbol,
-                "timeframe": timeframe,
-                "timestamp": ts,
-                "open": float(row["Open"]),
-                "high": float(row["High"]),
-                "low": float(row["Low"]),
-                "close": float(row["Close"]),
-                "volume": int(row["Volume"]),
-            }
+    return records
 
-            records.append(record)
 
-        if not records:
-            return
+# ----------------------------
+# CORE SAVE FUNCTION
+# ----------------------------
 
-        stmt = insert(MarketCandle).values(records)
+def mutable_cutoff():
+
+    # Only today's candles may change once stored
+    return datetime.combine(
+        datetime.now(timezone.utc).date(),
+        datetime.min.time(),
+        tzinfo=timezone.utc
+    )
+
+
+def _insert_candles(db, records, mutable_from):
+
+    count = 0
+
+    for i in range(0, len(records), UPSERT_CHUNK):
+
+        stmt = insert(MarketCandle).values(records[i:i + UPSERT_CHUNK])
 
         # Upsert — update only today's candles
         stmt = stmt.on_conflict_do_update(
@@ -87,22 +119,354 @@ def save_candles(symbol, timeframe, interval, period):
                 "close": stmt.excluded.close,
                 "volume": stmt.excluded.volume,
             },
-            where=MarketCandle.timestamp >= datetime.combine(
-                today_utc,
-                datetime.min.time(),
-                tzinfo=timezone.utc
-            )
+            where=MarketCandle.timestamp >= mutable_from
         )
 
-        result = db.execute(stmt)
+        count += db.execute(stmt).rowcount
+
+    return count
+
+
+# The whole batch is COPYed into a temp table (never WAL-logged) on
+# the session's connection, then merged with one INSERT ... SELECT.
+# Ids are uuid4s written into the COPY stream, as the ORM default
+# would make them, so the merge needs no server-side uuid function
+# (gen_random_uuid is core only from Postgres 13). DISTINCT ON keeps
+# a repeated bar from hitting the same row twice in one statement.
+STAGING_COLUMNS = ("id", "symbol", "timeframe", "timestamp", "open", "high", "low", "close", "volume")
+
+STAGING_DDL = """
+    CREATE TEMP TABLE candle_staging (
+        id uuid,
+        symbol text,
+        timeframe text,
+        timestamp timestamptz,
+        open double precision,
+        high double precision,
+        low double precision,
+        close double precision,
+        volume bigint
+    ) ON COMMIT DROP
+"""
+
+STAGING_MERGE = """
+    INSERT INTO market_candles
+        (id, symbol, timeframe, timestamp, open, high, low, close, volume)
+    SELECT DISTINCT ON (symbol, timeframe, timestamp)
+        id, symbol, timeframe, timestamp,
+        open, high, low, close, volume
+    FROM candle_staging
+    ORDER BY symbol, timeframe, timestamp
+    ON CONFLICT (symbol, timeframe, timestamp) DO UPDATE SET
+        open = EXCLUDED.open,
+        high = EXCLUDED.high,
+        low = EXCLUDED.low,
+        close = EXCLUDED.close,
+        volume = EXCLUDED.volume
+    WHERE market_candles.timestamp >= :mutable_from
+"""
+
+
+def _staging_csv(records):
+
+    buf = io.StringIO()
+
+    writer = csv.writer(buf)
+
+    for r in records:
+        writer.writerow([
+            uuid.uuid4(),
+            r["symbol"],
+            r["timeframe"],
+            r["timestamp"].isoformat(),
+            repr(r["open"]),
+            repr(r["high"]),
+            repr(r["low"]),
+            repr(r["close"]),
+            r["volume"],
+        ])
+
+    buf.seek(0)
+
+    return buf
+
+
+def _copy_candles(db, records, mutable_from):
+
+    db.execute(text(STAGING_DDL))
+
+    cursor = db.connection().connection.cursor()
+
+    try:
+        cursor.copy_expert(
+            f"COPY candle_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            _staging_csv(records)
+        )
+
+    finally:
+        cursor.close()
+
+    count = db.execute(text(STAGING_MERGE), {"mutable_from": mutable_from}).rowcount
+
+    # Several batches may share one transaction
+    db.execute(text("DROP TABLE candle_staging"))
+
+    return count
+
+
+def upsert_candles(db, records, mutable_from):
+
+    if CANDLE_WRITER == "copy":
+        return _copy_candles(db, records, mutable_from)
+
+    return _insert_candles(db, records, mutable_from)
+
+
+def apply_candle_hooks(timeframe, by_symbol, mutable_from):
+
+    # Incremental state that follows a batch of candle writes: one
+    # batched breadth and indicator update, one commit
+    db = SessionLocal()
+
+    try:
+        if timeframe == "1d":
+            update_breadth_states(db, by_symbol, mutable_from)
+
+        update_indicators(db, timeframe, by_symbol)
+
         db.commit()
 
-        print(f"{symbol} {timeframe} → Upserted {result.rowcount}")
+    finally:
+        db.close()
+
+
+def store_candle_batch(symbols, timeframe, interval, period=None, start=None, mutable_from=None):
+
+    # One download and one upsert for the whole batch; returns
+    # (symbol -> records written, cutoff used). Stored bars from
+    # `mutable_from` on are overwritten (default: today's only).
+    frames = download_batch(symbols, interval, period=period, start=start)
+
+    for symbol in symbols:
+        if symbol not in frames:
+            print(f"No data for {symbol} {timeframe}")
+
+    by_symbol = {
+        symbol: frame_records(symbol, timeframe, df)
+        for symbol, df in frames.items()
+    }
+
+    cutoff = mutable_from or mutable_cutoff()
+
+    records = [r for rows in by_symbol.values() for r in rows]
+
+    if not records:
+        return {}, cutoff
+
+    db = SessionLocal()
+
+    try:
+        upserted = upsert_candles(db, records, cutoff)
+        db.commit()
+
+        print(f"{len(by_symbol)} symbols {timeframe} → Upserted {upserted}")
+
+        return by_symbol, cutoff
 
     finally:
         db.close()
 
 
+def save_candle_batch(symbols, timeframe, interval, period=None, start=None, mutable_from=None):
+
+    # Store plus hooks; returns the symbols that had data
+    by_symbol, cutoff = store_candle_batch(symbols, timeframe, interval, period, start, mutable_from)
+
+    if by_symbol:
+        apply_candle_hooks(timeframe, by_symbol, cutoff)
+
+    return list(by_symbol)
+
+
+def save_candles(symbol, timeframe, interval, period):
+    return len(save_candle_batch([symbol], timeframe, interval, period))
+
+
+def _batches(groups):
+
+    # (start, symbols) tasks of at most BATCH_SIZE symbols
+    return [
+        (start, tuple(group[i:i + BATCH_SIZE]))
+        for start, group in groups
+        for i in range(0, len(group), BATCH_SIZE)
+    ]
+
+
+def fetch_groups(timeframe, groups, failures=None, overwrite=False):
+
+    # Downloads [(start, symbols)] groups in batches on the ingestion
+    # executor. Symbols missing from a batch's download are re-queued
+    # together at the end; whatever still fails lands in `failures`
+    # (symbol -> reason). `overwrite` lets stored bars from each
+    # group's start on be replaced, for repairs. Returns the symbols
+    # that were saved, sorted.
+    interval = TIMEFRAMES[timeframe]["interval"]
+
+    # Symbols whose derived state could not follow their candles
+    stale = {}
+
+    def save(task):
+
+        start, batch = task
+
+        mutable_from = (
+            datetime.combine(start, datetime.min.time(), tzinfo=ZoneInfo("Asia/Kolkata"))
+            if overwrite else None
+        )
+
+        return store_candle_batch(list(batch), timeframe, interval, start=start, mutable_from=mutable_from)
+
+    def hooks(task, stored):
+
+        # Runs once per stored batch, outside the executor's retries:
+        # the candles are committed, so a failure here must not
+        # download and upsert them again
+        by_symbol, cutoff = stored
+
+        if by_symbol:
+
+            try:
+                apply_candle_hooks(timeframe, by_symbol, cutoff)
+
+            except Exception as e:
+                print(f"{timeframe}: derived state update failed for {len(by_symbol)} symbols ({e})")
+                stale.update(dict.fromkeys(by_symbol, e))
+
+        return list(by_symbol)
+
+    executor = IngestionExecutor()
+
+    results, errors = executor.run(_batches(groups), save, after=hooks)
+
+    saved = {symbol for done in results.values() for symbol in done}
+
+    missing = {}
+
+    for start, batch in results:
+        for symbol in batch:
+            if symbol not in saved:
+                missing.setdefault(start, []).append(symbol)
+
+    if missing:
+
+        print(f"{timeframe}: re-queueing {sum(map(len, missing.values()))} symbols with no data")
+
+        retry, retry_errors = executor.run(_batches(sorted(missing.items())), save, after=hooks)
+
+        saved.update(symbol for done in retry.values() for symbol in done)
+        errors.update(retry_errors)
+
+    if stale:
+        rebuild_stale(timeframe, stale)
+
+    if failures is not None:
+
+        for symbol, error in stale.items():
+            failures[symbol] = f"{timeframe}: derived state: {error}"
+
+        for (_, batch), error in errors.items():
+            for symbol in batch:
+                failures[symbol] = f"{timeframe}: {error}"
+
+        for group in missing.values():
+            for symbol in group:
+                if symbol not in saved:
+                    failures[symbol] = f"{timeframe}: no data"
+
+    return sorted(saved)
+
+
+def rebuild_stale(timeframe, stale):
+
+    # Incremental updates chain off the stored state, so symbols that
+    # missed one are rebuilt from their full history; whatever still
+    # fails stays in `stale`
+    symbols = sorted(stale)
+
+    try:
+        if timeframe == "1d":
+            rebuild_breadth_state(symbols)
+
+        rebuild_indicator_store((timeframe,), symbols)
+
+    except Exception as e:
+        print(f"{timeframe}: derived state rebuild failed ({e})")
+        return
+
+    stale.clear()
+
+
+def ingest_timeframe(symbols, timeframe, failures=None):
+
+    # The planner decides what each symbol is missing; symbols with
+    # the same start share download batches. Returns (symbols saved,
+    # earliest start over symbols that already had bars or None,
+    # symbols fetched for the first time), so the caller can refresh
+    # derived data over the widened gap and seed the new symbols alone.
+    groups, seeds, skipped = plan_ingestion(timeframe, symbols)
+
+    fetched_from = groups[0][0] if groups else None
+    seeded = [symbol for _, group in seeds for symbol in group]
+
+    print(
+        f"{timeframe}: {len(symbols) - len(skipped)} symbols in "
+        f"{len(_batches(groups + seeds))} batches, {len(seeded)} new, "
+        f"{len(skipped)} already current"
+    )
+
+    saved = fetch_groups(timeframe, groups + seeds, failures)
+
+    return len(saved), fetched_from, seeded
+
+
+def format_failures(failures, limit=20):
+
+    if not failures:
+        return None
+
+    lines = [f"{symbol} ({reason})" for symbol, reason in sorted(failures.items())[:limit]]
+
+    if len(failures) > limit:
+        lines.append(f"... and {len(failures) - limit} more")
+
+    return f"{len(failures)} symbols failed: " + ", ".join(lines)
+
+
+# ----------------------------
+# DERIVED DATA (after 1d writes)
+# ----------------------------
+
+def refresh_daily_derivatives(since=None, seeded=None):
+
+    # `since`: earliest IST date whose daily bars were written (today
+    # when None); `seeded`: symbols whose whole history is new
+    today = datetime.now(ZoneInfo("Asia/Kolkata")).date()
+
+    since = min(since or today, today)
+    days = (today - since).days + 1
+
+    # Shared price panel first; breadth history reads from it. Only
+    # the refreshed window is read back and merged into it
+    update_price_panel(since, seeded)
+    update_breadth_history(days)
+
+    # Weekly / monthly bars
+    refresh_rollups(max(days, 7))
+
+    if seeded:
+        seed_rollups(seeded)
+
+
 # ----------------------------
 # INCREMENTAL INGESTION
 # ----------------------------
@@ -111,23 +475,24 @@ def run_incremental_ingestion():
 
     print("Starting Daily ingestion (Nifty 500 + Indices)")
 
-    for symbol in DAILY_SYMBOLS:
-        save_candles(
-            symbol,
-            "1d",
-            TIMEFRAMES["1d"]["interval"],
-            TIMEFRAMES["1d"]["period"]
-        )
+    failures = {}
+
+    rows_1d, fetched_from, seeded = ingest_timeframe(DAILY_SYMBOLS, "1d", failures)
 
     print("Starting 2h ingestion (Indices only)")
 
-    for symbol in INTRADAY_SYMBOLS:
-        save_candles(
-            symbol,
-            "2h",
-            TIMEFRAMES["2h"]["interval"],
-            TIMEFRAMES["2h"]["period"]
-        )
+    rows_2h, _, _ = ingest_timeframe(INTRADAY_SYMBOLS, "2h", failures)
+
+    refresh_daily_derivatives(fetched_from, seeded)
+
+    log_ingestion(
+        job_type="manual",
+        status="SUCCESS",
+        rows=rows_1d + rows_2h,
+        error=format_failures(failures)
+    )
+
+    invalidate_breadth_cache()
 
     print("Incremental ingestion complete ✅")
 
@@ -146,44 +511,36 @@ if __name__ == "__main__":
 # Helper Functions for Scheduler
 # -----------------------------------
 
-def ingest_2h_candles():
+def ingest_2h_candles(failures=None):
+    return ingest_timeframe(INTRADAY_SYMBOLS, "2h", failures)
 
-    count = 0
 
-    for symbol in INTRADAY_SYMBOLS:
-        save_candles(
-            symbol,
-            "2h",
-            TIMEFRAMES["2h"]["interval"],
-            TIMEFRAMES["2h"]["period"]
-        )
-        count += 1
+def ingest_daily_candles(failures=None):
+    return ingest_timeframe(DAILY_SYMBOLS, "1d", failures)
 
-    return count
 
+def alert_failures(job, failures):
 
-def ingest_daily_candles():
+    if not failures:
+        return
 
-    count = 0
+    message = f"""
+        Nifty Dashboard Warning
 
-    for symbol in DAILY_SYMBOLS:
-        save_candles(
-            symbol,
-            "1d",
-            TIMEFRAMES["1d"]["interval"],
-            TIMEFRAMES["1d"]["period"]
-        )
-        count += 1
+        Job: {job}
+        Status: COMPLETED with failures
 
-    return count
+        {format_failures(failures)}
+        """
+
+    send_telegram_alert(message)
 
 
 def reingest_day(target_date):
 
     print(f"Repairing candles for {target_date}")
 
-    ingest_daily_candles()
-    ingest_2h_candles()
+    return repair_range(target_date, target_date)
 
 
 # -----------------------------------
@@ -198,14 +555,21 @@ def run_intraday_ingestion():
 
     try:
 
-        rows = ingest_2h_candles()
+        failures = {}
+
+        rows, _, _ = ingest_2h_candles(failures)
 
         log_ingestion(
             job_type="intraday_2h",
             status="SUCCESS",
-            rows=rows
+            rows=rows,
+            error=format_failures(failures)
         )
 
+        alert_failures("Intraday 2H Ingestion", failures)
+
+        invalidate_breadth_cache()
+
         print("Intraday ingestion complete")
 
     except Exception as e:
@@ -241,10 +605,14 @@ def run_market_close_ingestion():
 
     try:
 
-        rows_2h = ingest_2h_candles()
-        rows_1d = ingest_daily_candles()
+        failures = {}
 
-        repair_last_days(3)
+        rows_2h, _, _ = ingest_2h_candles(failures)
+        rows_1d, fetched_from, seeded = ingest_daily_candles(failures)
+
+        # Also refreshes the panel, breadth state and history, over
+        # the daily run's range as well as its own
+        repair_last_days(3, since=fetched_from, seeded=seeded)
 
         total_rows = rows_2h + rows_1d
 
@@ -258,30 +626,35 @@ def run_market_close_ingestion():
                     ZoneInfo("Asia/Kolkata")
             )
 
-        warning_msg = f"""
-        Nifty Dashboard Warning
+            warning_msg = f"""
+            Nifty Dashboard Warning
 
-        Job: Market Close Ingestion
-        Status: COMPLETED but NO DATA
+            Job: Market Close Ingestion
+            Status: COMPLETED but NO DATA
 
-        Rows Updated: 0
+            Rows Updated: 0
 
-        Time: {ist_now.strftime("%d %b %Y %I:%M %p IST")}
+            Time: {ist_now.strftime("%d %b %Y %I:%M %p IST")}
 
-        Possible causes:
-        • Yahoo API returned empty data
-        • Network issue
-        • Market holiday mismatch
-        """
+            Possible causes:
+            • Yahoo API returned empty data
+            • Network issue
+            • Market holiday mismatch
+            """
 
-        send_telegram_alert(warning_msg)
+            send_telegram_alert(warning_msg)
 
         log_ingestion(
             job_type="market_close",
             status="SUCCESS",
-            rows=total_rows
+            rows=total_rows,
+            error=format_failures(failures)
         )
 
+        alert_failures("Market Close Ingestion", failures)
+
+        invalidate_breadth_cache()
+
         # -----------------------------
         # Telegram SUCCESS Alert
         # -----------------------------
@@ -343,19 +716,77 @@ def run_market_close_ingestion():
 # Repair last N days
 # -----------------------------------
 
-def repair_last_days(days):
+# Only (symbol, session) pairs that are missing, short of bars or
+# malformed are refetched, each symbol from its earliest bad session.
+
+REPAIR_SYMBOLS = {
+    "1d": DAILY_SYMBOLS,
+    "2h": INTRADAY_SYMBOLS,
+}
+
+
+def repair_range(start, end, failures=None):
+
+    # Sessions from start to end (IST dates); returns timeframe ->
+    # symbols refetched, for the timeframes that had any
+    repaired = {}
+
+    for timeframe, symbols in REPAIR_SYMBOLS.items():
+
+        repairs = find_repairs(timeframe, symbols, start, end)
+
+        bad = sum(map(len, repairs.values()))
+
+        print(f"{timeframe}: {bad} bad sessions across {len(repairs)} symbols")
+
+        for symbol, days in list(repairs.items())[:10]:
+            print(f"  {symbol}: " + ", ".join(f"{d} {reason}" for d, reason in days))
+
+        if repairs:
+            saved = fetch_groups(timeframe, repair_groups(repairs), failures, overwrite=True)
+
+            if saved:
+                repaired[timeframe] = saved
+
+    return repaired
 
-    repaired = 0
 
-    for i in range(days + 1):
+def repair_last_days(days, since=None, seeded=None):
 
-        target_date = datetime.now(timezone.utc).date() - timedelta(days=i)
+    # `since` / `seeded` come from an ingestion run this repair
+    # follows, so one derived refresh covers both
 
-        print(f"Repairing candles for {target_date}")
+    failures = {}
 
-        reingest_day(target_date)
+    now = datetime.now(ZoneInfo("Asia/Kolkata"))
 
-        repaired += 1
+    end = latest_session(now)
+    start = now.date() - timedelta(days=days)
+
+    repaired = repair_range(start, end, failures)
+
+    # Repair can fill gaps behind the incremental state, which only
+    # ever moves forward; rebuild it for the symbols that changed
+    if repaired.get("1d"):
+        rebuild_breadth_state(symbols=repaired["1d"])
+
+    count = len({symbol for symbols in repaired.values() for symbol in symbols})
+
+    if since is not None:
+        start = min(start, since)
+
+    refresh_daily_derivatives(start, seeded)
+
+    # Logged like an ingestion so the data version moves on: ETags
+    # and cached scans keyed on it must not outlive rewritten candles
+    log_ingestion(
+        job_type="repair",
+        status="SUCCESS",
+        rows=count,
+        error=format_failures(failures)
+    )
+
+    invalidate_breadth_cache()
 
     # -----------------------------
     # Notify admin when repair finishes
@@ -368,9 +799,17 @@ def repair_last_days(days):
     message = f"""
     Nifty Dashboard Repair Completed
 
-    Days Repaired: {repaired}
+    Days Checked: {days + 1}
+    Symbols Repaired: {count}
 
     Time: {ist_now.strftime("%d %b %Y %I:%M %p IST")}
     """
 
-    send_telegram_alert(message)
\ No newline at end of file
+    if failures:
+        message += f"""
+    {format_failures(failures)}
+    """
+
+    send_telegram_alert(message)
+
+    return count
@@ -0,0 +1,168 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+# ---------------------------
+# Config
+# ---------------------------
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 4))
+
+# Provider calls per second, and how many may go out back to back
+INGEST_RATE = float(os.getenv("INGEST_RATE", 2))
+INGEST_BURST = int(os.getenv("INGEST_BURST", 4))
+
+# Attempts after the first one, per task and round
+INGEST_RETRIES = int(os.getenv("INGEST_RETRIES", 3))
+
+BACKOFF_BASE = float(os.getenv("INGEST_BACKOFF_BASE", 1.0))
+BACKOFF_MAX = float(os.getenv("INGEST_BACKOFF_MAX", 30.0))
+
+
+# ---------------------------
+# Rate limiting
+# ---------------------------
+
+class TokenBucket:
+
+    def __init__(self, rate, capacity):
+
+        self.rate = rate
+        self.capacity = capacity
+
+        self._lock = threading.Lock()
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def acquire(self):
+
+        while True:
+
+            with self._lock:
+
+                now = time.monotonic()
+
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+# One bucket for the process: every executor talks to the same provider
+PROVIDER_BUCKET = TokenBucket(INGEST_RATE, INGEST_BURST)
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+
+    # Full jitter: anywhere up to the exponential ceiling, so retries
+    # from parallel workers do not line up again
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+# ---------------------------
+# Executor
+# ---------------------------
+# Runs fn(task) for every task on a bounded thread pool. Each call
+# takes a provider token first and is retried with backoff on any
+# exception. Tasks still failing once the pool has drained are
+# re-queued for one more round at the end of the run, when the
+# provider has had time to recover.
+#
+# `after(task, result)`, if given, runs once on the worker right after
+# fn succeeds, without a token and outside the retries, so work that
+# follows a provider call never repeats the call; its return value is
+# the task's result. It must handle its own errors.
+
+class IngestionExecutor:
+
+    def __init__(
+        self,
+        workers=INGEST_WORKERS,
+        retries=INGEST_RETRIES,
+        bucket=PROVIDER_BUCKET,
+        requeue_rounds=1
+    ):
+
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        self.workers = workers
+        self.retries = retries
+        self.bucket = bucket
+        self.requeue_rounds = requeue_rounds
+
+    def _attempt(self, fn, task, after=None):
+
+        for attempt in range(self.retries + 1):
+
+            self.bucket.acquire()
+
+            try:
+                result = fn(task)
+
+            except Exception as e:
+
+                error = e
+
+                if attempt < self.retries:
+
+                    delay = backoff_delay(attempt)
+
+                    print(f"Ingestion task {task} failed ({e}), retrying in {delay:.1f}s")
+
+                    time.sleep(delay)
+
+                continue
+
+            if after is not None:
+                result = after(task, result)
+
+            return True, result
+
+        return False, error
+
+    def run(self, tasks, fn, after=None):
+
+        # (task -> result, task -> last exception); tasks must be hashable
+        results = {}
+        failures = {}
+
+        pending = list(tasks)
+
+        for round_no in range(self.requeue_rounds + 1):
+
+            if not pending:
+                break
+
+            if round_no:
+                print(f"Re-queueing {len(pending)} failed ingestion tasks")
+
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(pending))) as pool:
+                outcomes = list(pool.map(lambda task: self._attempt(fn, task, after), pending))
+
+            failed = []
+
+            for task, (ok, value) in zip(pending, outcomes):
+
+                if ok:
+                    results[task] = value
+                    failures.pop(task, None)
+                else:
+                    failures[task] = value
+                    failed.append(task)
+
+            pending = failed
+
+        return results, failures
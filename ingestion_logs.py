@@ -3,6 +3,7 @@ from sqlalchemy import text
 from database import SessionLocal
 from models import IngestionLog
 from sqlalchemy import desc
+from zoneinfo import ZoneInfo
 
 
 def log_ingestion(job_type, status, rows, error=None):
@@ -44,4 +45,31 @@ def get_last_successful_ingestion():
         return None
 
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def format_ingestion_time(run_time):
+
+    if not run_time:
+        return "Unknown"
+
+    # database stores UTC
+    utc_time = run_time.replace(tzinfo=ZoneInfo("UTC"))
+
+    # convert to IST
+    ist_time = utc_time.astimezone(ZoneInfo("Asia/Kolkata"))
+
+    return ist_time.strftime("%d %b %Y %I:%M %p IST")
+
+
+def get_last_updated_label():
+    return format_ingestion_time(get_last_successful_ingestion())
+
+
+def get_data_version():
+
+    # Advances with every successful ingestion or repair, and any
+    # other write logged through log_ingestion
+    last = get_last_successful_ingestion()
+
+    return last.isoformat() if last else "none"
@@ -0,0 +1,141 @@
+import os
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from sqlalchemy import func
+from database import SessionLocal
+from models import MarketCandle
+from market_calendar import is_trading_day, last_trading_day
+
+
+# ---------------------------
+# Config
+# ---------------------------
+
+IST = ZoneInfo("Asia/Kolkata")
+
+MARKET_OPEN = time(9, 15)
+MARKET_CLOSE = time(15, 30)
+
+# A session's bars count as final this long after the close
+SETTLE_MINUTES = int(os.getenv("INGEST_SETTLE_MINUTES", 60))
+
+# History requested for a symbol with nothing stored yet
+FIRST_FETCH_DAYS = {
+    "1d": int(os.getenv("INGEST_FIRST_FETCH_DAYS_1D", 2000)),
+    "2h": int(os.getenv("INGEST_FIRST_FETCH_DAYS_2H", 729)),
+}
+
+# How far back the provider serves each timeframe (Yahoo keeps 730
+# days of 60m bars); None means no limit
+PROVIDER_MAX_DAYS = {
+    "1d": None,
+    "2h": 729,
+}
+
+
+# ---------------------------
+# Stored state
+# ---------------------------
+
+def latest_timestamps(timeframe, symbols=None, db=None):
+
+    # symbol -> latest stored bar, one grouped query
+    own_session = db is None
+
+    if own_session:
+        db = SessionLocal()
+
+    try:
+        q = (
+            db.query(MarketCandle.symbol, func.max(MarketCandle.timestamp))
+            .filter(MarketCandle.timeframe == timeframe)
+        )
+
+        if symbols is not None:
+            q = q.filter(MarketCandle.symbol.in_(list(symbols)))
+
+        return dict(q.group_by(MarketCandle.symbol).all())
+
+    finally:
+        if own_session:
+            db.close()
+
+
+# ---------------------------
+# Sessions
+# ---------------------------
+
+def latest_session(now):
+
+    # Most recent session whose bars can exist at `now` (IST)
+    today = now.date()
+
+    if is_trading_day(today) and now.time() >= MARKET_OPEN:
+        return today
+
+    return last_trading_day(today - timedelta(days=1))
+
+
+def session_settled(session, now):
+
+    if session < now.date():
+        return True
+
+    settle = datetime.combine(session, MARKET_CLOSE, tzinfo=IST) + timedelta(minutes=SETTLE_MINUTES)
+
+    return now >= settle
+
+
+# ---------------------------
+# Planner
+# ---------------------------
+# Every symbol is fetched from the IST date of its latest stored bar
+# (inclusive, so a bar stored mid-session is refreshed) up to now.
+# A symbol holding the latest session's bar once that session has
+# settled is current and skipped. Gaps of any length widen the
+# request, up to what the provider serves. Symbols with nothing
+# stored are planned apart, as seeds: their first fetch reaches far
+# further back than any gap, and callers size follow-up work on the
+# gaps alone.
+
+def plan_ingestion(timeframe, symbols, db=None, now=None):
+
+    # ([(start date, [symbols])] for stored symbols, the same for new
+    # symbols, skipped symbols); starts ascending
+    now = now or datetime.now(IST)
+
+    latest = latest_timestamps(timeframe, symbols, db)
+
+    session = latest_session(now)
+    settled = session_settled(session, now)
+
+    limit = PROVIDER_MAX_DAYS.get(timeframe)
+    oldest = now.date() - timedelta(days=limit) if limit else None
+
+    groups = {}
+    seeds = {}
+    skipped = []
+
+    for symbol in symbols:
+
+        last = latest.get(symbol)
+
+        if last is None:
+            start = now.date() - timedelta(days=FIRST_FETCH_DAYS[timeframe])
+            target = seeds
+
+        else:
+            start = last.astimezone(IST).date()
+            target = groups
+
+            if start >= session and settled:
+                skipped.append(symbol)
+                continue
+
+        if oldest is not None and start < oldest:
+            print(f"{symbol} {timeframe}: gap since {start} is past the provider limit, fetching from {oldest}")
+            start = oldest
+
+        target.setdefault(start, []).append(symbol)
+
+    return sorted(groups.items()), sorted(seeds.items()), skipped
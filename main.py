@@ -3,19 +3,34 @@ load_dotenv()
 
 import os
 import secrets
+import orjson
 
 from fastapi import FastAPI, Request, Query, Form, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 from metadata_service import update_symbol_metadata
 from authlib.integrations.starlette_client import OAuth
 from metadata_service import update_group_mappings
-from breadth_engine import calculate_breadth
+from breadth_engine import (
+    calculate_breadth,
+    breadth_etag,
+    breadth_json,
+    get_breadth_base,
+    invalidate_breadth_cache
+)
 from init_db import init_db
 from user_service import get_user_by_email
-from admin.strategy_lab_service import run_strategy_scan
+from admin.strategy_lab_service import (
+    run_strategy_scans,
+    stream_strategy_scans,
+    run_confluence_scan,
+    CONFLUENCE_TIMEFRAMES,
+    SCAN_CACHE
+)
+from admin.strategy_registry import STRATEGIES, strategy_options
+from admin.strategy_backtest import run_backtest
 from ingest_candles import run_incremental_ingestion
 from database import engine, Base
 from auth_service import *
@@ -24,7 +39,7 @@ from ingest_candles import repair_last_days
 from fastapi import BackgroundTasks
 from telegram_alert import send_telegram_alert
 from zoneinfo import ZoneInfo
-from ingestion_logs import get_last_successful_ingestion
+from ingestion_logs import get_last_successful_ingestion, get_last_updated_label, log_ingestion
 from datetime import datetime
 
 # --------------------------
@@ -81,8 +96,8 @@ oauth.register(
 # --------------------------
 
 PERMISSIONS = {
-    "viewer": ["/dashboard"],
-    "trader": ["/dashboard", "/fno"],
+    "viewer": ["/dashboard", "/api/breadth"],
+    "trader": ["/dashboard", "/fno", "/api/breadth"],
     "admin": ["*"]
 }
 
@@ -232,6 +247,40 @@ def dashboard(
     )
 
 
+# --------------------------
+# BREADTH API
+# --------------------------
+
+@app.get("/api/breadth")
+def breadth_api(
+    request: Request,
+    ema5: str | None = Query(default=None),
+    ema20: str | None = Query(default=None),
+):
+
+    # One snapshot for both, so the ETag always describes the body
+    base = get_breadth_base()
+
+    etag = breadth_etag(ema5_filter=ema5, ema20_filter=ema20, base=base)
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache"
+    }
+
+    if_none_match = request.headers.get("if-none-match", "")
+    client_tags = [t.strip() for t in if_none_match.split(",")]
+
+    if etag in client_tags or "*" in client_tags:
+        return Response(status_code=304, headers=headers)
+
+    return Response(
+        content=breadth_json(ema5_filter=ema5, ema20_filter=ema20, base=base),
+        media_type="application/json",
+        headers=headers
+    )
+
+
 # --------------------------
 # ADMIN PANEL
 # --------------------------
@@ -247,6 +296,7 @@ def admin_panel(request: Request, user=Depends(require_admin)):
             "request": request,
             "users": users,
             "user": user,
+            "scan_cache": SCAN_CACHE.stats(),
             "csrf_token": generate_csrf_token(request.session)
         }
     )
@@ -330,14 +380,15 @@ def admin_delete_user(
 @app.get("/admin/strategy-lab", response_class=HTMLResponse)
 def strategy_lab_page(request: Request, user=Depends(require_admin)):
 
-    data = calculate_breadth()
+    last_updated = get_last_updated_label()
     return templates.TemplateResponse(
         "strategy_lab.html",
         {
             "request": request,
-            "data": data,
+            "last_updated": last_updated,
+            "strategies": strategy_options(),
             "results": None,
-            "selected_strategy": None,
+            "selected_strategies": [],
             "selected_timeframe": None,
             "selected_lookback": None,
             "include_live": False
@@ -348,7 +399,7 @@ def strategy_lab_page(request: Request, user=Depends(require_admin)):
 @app.post("/admin/strategy-lab", response_class=HTMLResponse)
 def strategy_lab_scan(
     request: Request,
-    strategy_type: str | None = Form(None),
+    strategy_type: list[str] = Form([]),
     timeframe: str | None = Form(None),
     lookback: int = Form(...),
     include_live: str | None = Form(None),
@@ -356,22 +407,158 @@ def strategy_lab_scan(
 ):
     
     use_live_candle = include_live == "true"
-    data = calculate_breadth()
 
-    results = run_strategy_scan(
-        strategy_type=strategy_type,
+    strategy_types = [s for s in strategy_type if s in STRATEGIES]
+
+    if not strategy_types:
+        return HTMLResponse("Please select a valid strategy", status_code=400)
+
+    last_updated = get_last_updated_label()
+
+    scans = run_strategy_scans(
+        strategy_types=strategy_types,
         timeframe=timeframe,
         lookback=int(lookback),
         use_live_candle=use_live_candle
     )
 
+    # One table; rows carry the strategy when several were run
+    results = sorted(
+        (
+            {**r, "strategy": STRATEGIES[key]["label"]}
+            for key, rows in scans.items()
+            for r in rows
+        ),
+        key=lambda x: x["bars_since_cross"]
+    )
+
     return templates.TemplateResponse(
         "strategy_lab.html",
         {
             "request": request,
-            "data": data,
+            "last_updated": last_updated,
+            "strategies": strategy_options(),
             "results": results,
-            "selected_strategy": strategy_type,
+            "selected_strategies": strategy_types,
+            "selected_timeframe": timeframe,
+            "selected_lookback": lookback,
+            "include_live": use_live_candle
+        }
+    )
+
+
+@app.post("/admin/strategy-lab/stream")
+def strategy_lab_stream(
+    strategy_type: list[str] = Form([]),
+    timeframe: str | None = Form(None),
+    lookback: int = Form(...),
+    include_live: str | None = Form(None),
+    user=Depends(require_admin)
+):
+
+    strategy_types = [s for s in strategy_type if s in STRATEGIES]
+
+    if not strategy_types:
+        return HTMLResponse("Please select a valid strategy", status_code=400)
+
+    events = stream_strategy_scans(
+        strategy_types=strategy_types,
+        timeframe=timeframe,
+        lookback=int(lookback),
+        use_live_candle=include_live == "true"
+    )
+
+    # One JSON object per line, flushed as each chunk finishes
+    return StreamingResponse(
+        (orjson.dumps(e) + b"\n" for e in events),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/admin/strategy-lab/backtest", response_class=HTMLResponse)
+def strategy_lab_backtest(
+    request: Request,
+    strategy_type: list[str] = Form([]),
+    timeframe: str | None = Form(None),
+    lookback: int = Form(...),
+    include_live: str | None = Form(None),
+    user=Depends(require_admin)
+):
+
+    use_live_candle = include_live == "true"
+
+    strategy_types = [s for s in strategy_type if s in STRATEGIES]
+
+    if not strategy_types:
+        return HTMLResponse("Please select a valid strategy", status_code=400)
+
+    last_updated = get_last_updated_label()
+
+    backtest = run_backtest(
+        strategy_types=strategy_types,
+        timeframe=timeframe,
+        use_live_candle=use_live_candle
+    )
+
+    return templates.TemplateResponse(
+        "strategy_lab.html",
+        {
+            "request": request,
+            "last_updated": last_updated,
+            "strategies": strategy_options(),
+            "results": None,
+            "backtest": backtest,
+            "selected_strategies": strategy_types,
+            "selected_timeframe": timeframe,
+            "selected_lookback": lookback,
+            "include_live": use_live_candle
+        }
+    )
+
+
+@app.post("/admin/strategy-lab/confluence", response_class=HTMLResponse)
+def strategy_lab_confluence(
+    request: Request,
+    strategy_type: list[str] = Form([]),
+    timeframe: str | None = Form(None),
+    lookback: int = Form(...),
+    include_live: str | None = Form(None),
+    user=Depends(require_admin)
+):
+
+    use_live_candle = include_live == "true"
+
+    strategy_types = [s for s in strategy_type if s in STRATEGIES]
+
+    if not strategy_types:
+        return HTMLResponse("Please select a valid strategy", status_code=400)
+
+    last_updated = get_last_updated_label()
+
+    scans = run_confluence_scan(
+        strategy_types=strategy_types,
+        lookback=lookback,
+        use_live_candle=use_live_candle
+    )
+
+    # One table, grouped by strategy in selection order
+    confluence = [
+        {**r, "strategy": STRATEGIES[key]["label"]}
+        for key in strategy_types
+        for r in scans[key]
+    ]
+
+    return templates.TemplateResponse(
+        "strategy_lab.html",
+        {
+            "request": request,
+            "last_updated": last_updated,
+            "strategies": strategy_options(),
+            "results": None,
+            "confluence": confluence,
+            "confluence_timeframes": CONFLUENCE_TIMEFRAMES,
+            "selected_strategies": strategy_types,
             "selected_timeframe": timeframe,
             "selected_lookback": lookback,
             "include_live": use_live_candle
@@ -449,6 +636,11 @@ def run_group_update(request: Request):
 
     update_group_mappings()
 
+    # Group membership feeds the breadth snapshot; move the data
+    # version on so ETags and cached views follow it
+    log_ingestion(job_type="group_mapping", status="SUCCESS", rows=0)
+    invalidate_breadth_cache()
+
     return RedirectResponse("/admin", status_code=302)
 
 # --------------------------
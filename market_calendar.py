@@ -1,17 +1,45 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from nse_holidays import NSE_HOLIDAYS
 
 
-def is_market_day():
-
-    today = datetime.now().date()
+def is_trading_day(day):
 
     # Weekend
-    if today.weekday() >= 5:
+    if day.weekday() >= 5:
         return False
 
     # NSE holiday
-    if today in NSE_HOLIDAYS:
+    if day in NSE_HOLIDAYS:
         return False
 
-    return True
\ No newline at end of file
+    return True
+
+
+def is_market_day():
+    return is_trading_day(datetime.now().date())
+
+
+def last_trading_day(day):
+
+    # `day` itself when it is a session, else the one before it
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+
+    return day
+
+
+def trading_days(start, end):
+
+    # Sessions from start to end, both inclusive
+    days = []
+
+    day = start
+
+    while day <= end:
+
+        if is_trading_day(day):
+            days.append(day)
+
+        day += timedelta(days=1)
+
+    return days
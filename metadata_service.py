@@ -1,4 +1,4 @@
-import yfinance as yf
+from candle_sources import get_candle_source
 from datetime import datetime
 from database import SessionLocal
 from models import SymbolMetadata
@@ -12,14 +12,14 @@ GROUP_DIR = "data/groups"
 def update_symbol_metadata():
 
     symbols = load_stock_universe()
+    source = get_candle_source()
     db = SessionLocal()
 
     try:
         for symbol in symbols:
 
             try:
-                ticker = yf.Ticker(symbol)
-                info = ticker.info
+                info = source.info(symbol)
 
                 sector = info.get("sector")
                 industry = info.get("industry")
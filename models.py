@@ -1,6 +1,6 @@
 import uuid
-from sqlalchemy import Column, String, DateTime, Float, BigInteger, Index, Boolean, Integer, Text 
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, DateTime, Date, Float, BigInteger, Index, Boolean, Integer, SmallInteger, Text 
+from sqlalchemy.dialects.postgresql import UUID, ARRAY
 from sqlalchemy.sql import func
 from database import Base
 from sqlalchemy import UniqueConstraint
@@ -62,6 +62,85 @@ class MarketCandle(Base):
     
 
 
+class BreadthState(Base):
+
+    __tablename__ = "breadth_state"
+
+    symbol = Column(String, primary_key=True)
+
+    last_timestamp = Column(DateTime(timezone=True), nullable=False)
+    bar_count = Column(Integer, nullable=False)
+
+    # Last N daily closes, oldest first
+    closes = Column(ARRAY(Float), nullable=False)
+
+    # EMA numerator / denominator carry as of the bar before the latest
+    ema5_num = Column(Float, nullable=False)
+    ema5_den = Column(Float, nullable=False)
+    ema20_num = Column(Float, nullable=False)
+    ema20_den = Column(Float, nullable=False)
+
+    updated_at = Column(DateTime(timezone=True))
+
+
+class BreadthHistory(Base):
+
+    __tablename__ = "breadth_history"
+
+    date = Column(Date, primary_key=True)
+
+    # Sector / theme name, or "MARKET" for the whole universe
+    group_name = Column(String, primary_key=True)
+
+    advances = Column(Integer, nullable=False)
+    declines = Column(Integer, nullable=False)
+    adv_pct = Column(Float, nullable=False)
+
+    above_10_dma_pct = Column(Float, nullable=False)
+    above_20_dma_pct = Column(Float, nullable=False)
+    above_40_dma_pct = Column(Float, nullable=False)
+
+    up_4_count = Column(Integer, nullable=False)
+    down_4_count = Column(Integer, nullable=False)
+
+    momentum = Column(Float, nullable=False)
+    strength = Column(Float, nullable=False)
+    phase = Column(String, nullable=False)
+
+    __table_args__ = (
+        Index("idx_breadth_history_group_date", "group_name", "date"),
+    )
+
+
+class IndicatorValue(Base):
+
+    __tablename__ = "indicator_values"
+
+    symbol = Column(String, primary_key=True)
+    timeframe = Column(String, primary_key=True)
+    timestamp = Column(DateTime(timezone=True), primary_key=True)
+
+    # 0-based position in the symbol's bar history
+    bar_index = Column(Integer, nullable=False)
+
+    close = Column(Float, nullable=False)
+
+    # ewm(adjust=False) EMAs
+    ema5 = Column(Float, nullable=False)
+    ema20 = Column(Float, nullable=False)
+    ema55 = Column(Float, nullable=False)
+    ema80 = Column(Float, nullable=False)
+    ema200 = Column(Float, nullable=False)
+
+    # True range, its 10 bar mean, and the supertrend bands / carry
+    tr = Column(Float)
+    atr = Column(Float)
+    st_upper = Column(Float)
+    st_lower = Column(Float)
+    supertrend = Column(Float)
+    st_direction = Column(SmallInteger, nullable=False)
+
+
 class SymbolMetadata(Base):
     __tablename__ = "symbol_metadata"
 
@@ -0,0 +1,245 @@
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from candle_service import load_candle_window, dedupe_daily, IST
+
+
+# ---------------------------
+# Config
+# ---------------------------
+
+PANEL_DIR = os.getenv("PRICE_PANEL_DIR", tempfile.gettempdir())
+PANEL_PATH = os.path.join(PANEL_DIR, "price_panel_1d.bin")
+
+FIELDS = ("open", "high", "low", "close", "volume")
+
+MAGIC = b"NIFTYPNL"
+ALIGN = 64
+
+
+# ---------------------------
+# File layout
+# ---------------------------
+# MAGIC | uint64 header length | JSON header | padding to ALIGN
+# then one float64 (dates x symbols) block per field, in FIELDS order.
+#
+# The header carries a version plus the date and symbol axes.
+# Writers build the whole file under a temporary name and
+# os.replace() it into place, so a reader either sees the old file
+# or the new one. Mappings already open keep the old inode alive
+# until they are dropped.
+
+def _data_offset(header_len):
+    return -(-(len(MAGIC) + 8 + header_len) // ALIGN) * ALIGN
+
+
+def _wide(df):
+
+    # One bar per IST trading date; this also drops Yahoo's
+    # duplicate 00:00 / 18:30 UTC daily candles (last wins)
+    df = dedupe_daily(df)
+
+    dates = (
+        pd.to_datetime(df["timestamp"], utc=True)
+        .dt.tz_convert("Asia/Kolkata")
+        .dt.tz_localize(None)
+        .dt.normalize()
+    )
+
+    return (
+        df.assign(date=dates)
+        .set_index(["date", "symbol"])[list(FIELDS)]
+        .unstack("symbol")
+        .sort_index()
+    )
+
+
+def write_price_panel(df=None, path=PANEL_PATH):
+
+    # Full rebuild (backfill): every stored daily bar, or `df`
+    if df is None:
+        df = load_candle_window("1d")
+
+    if df.empty:
+        return None
+
+    return _write_wide(_wide(df), path)
+
+
+def _write_wide(wide, path):
+
+    symbols = list(wide["close"].columns)
+
+    header = json.dumps({
+        "version": time.time_ns(),
+        "fields": list(FIELDS),
+        "dates": [d.strftime("%Y-%m-%d") for d in wide.index],
+        "symbols": symbols,
+    }).encode()
+
+    padding = _data_offset(len(header)) - len(MAGIC) - 8 - len(header)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            f.write(b"\0" * padding)
+
+            for field in FIELDS:
+                block = wide[field].reindex(columns=symbols).to_numpy(dtype=np.float64)
+                f.write(np.ascontiguousarray(block).tobytes())
+
+        os.replace(tmp, path)
+
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    print(f"Price panel written: {len(wide)} dates x {len(symbols)} symbols")
+
+    return path
+
+
+# ---------------------------
+# Incremental update
+# ---------------------------
+# After ingestion or repair only the refreshed window is read back:
+# bars from the IST date `since` on, for every symbol, plus the whole
+# history of `seeded` symbols (fetched for the first time). Those
+# replace the matching cells of the current panel and everything
+# before `since` is kept. Without a panel to merge into, this falls
+# back to the full rebuild.
+
+def update_price_panel(since, seeded=None, path=PANEL_PATH):
+
+    panel = open_price_panel(path)
+
+    if panel is None or panel.fields != list(FIELDS):
+        return write_price_panel(path=path)
+
+    seeded = sorted(set(seeded or []))
+
+    frames = [load_candle_window(
+        "1d",
+        since=datetime.combine(since, datetime.min.time(), tzinfo=IST)
+    )]
+
+    if seeded:
+        frames.append(load_candle_window("1d", symbols=seeded))
+
+    frames = [f for f in frames if not f.empty]
+
+    if not frames:
+        return path
+
+    # A seeded symbol's history overlaps the window
+    fresh = _wide(pd.concat(frames).drop_duplicates(["symbol", "timestamp"]))
+
+    cutoff = pd.Timestamp(since)
+
+    merged = {}
+
+    for field in FIELDS:
+
+        old = panel.frame(field)
+        old = old[old.index < cutoff].drop(columns=seeded, errors="ignore")
+
+        merged[field] = old.combine_first(fresh[field])
+
+    wide = pd.concat(merged, axis=1)
+
+    return _write_wide(wide.sort_index().sort_index(axis=1), path)
+
+
+# ---------------------------
+# Reader
+# ---------------------------
+
+class PricePanel:
+
+    def __init__(self, path):
+
+        with open(path, "rb") as f:
+
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a price panel: {path}")
+
+            (header_len,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_len))
+
+            stat = os.fstat(f.fileno())
+
+            self.version = header["version"]
+            self.fields = header["fields"]
+            self.symbols = header["symbols"]
+            self.dates = pd.DatetimeIndex(header["dates"])
+
+            self._inode = (stat.st_ino, stat.st_mtime_ns)
+            self._column = {s: i for i, s in enumerate(self.symbols)}
+
+            self._data = np.memmap(
+                f,
+                dtype=np.float64,
+                mode="r",
+                offset=_data_offset(header_len),
+                shape=(len(self.fields), len(self.dates), len(self.symbols))
+            )
+
+    def field(self, name):
+        return self._data[self.fields.index(name)]
+
+    def frame(self, name):
+        return pd.DataFrame(
+            self.field(name),
+            index=self.dates,
+            columns=self.symbols,
+            copy=False
+        )
+
+    def symbol_frame(self, symbol, bars=None):
+
+        col = self._column[symbol]
+
+        g = pd.DataFrame(
+            {name.capitalize(): self.field(name)[:, col] for name in self.fields},
+            index=self.dates
+        )
+
+        g = g.dropna(subset=["Close"])
+
+        return g if bars is None else g.iloc[-bars:]
+
+
+_PANEL = None
+_PANEL_LOCK = threading.Lock()
+
+
+def open_price_panel(path=PANEL_PATH):
+
+    global _PANEL
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    with _PANEL_LOCK:
+
+        # Re-map only when the file was swapped
+        if _PANEL is None or _PANEL._inode != (stat.st_ino, stat.st_mtime_ns):
+            _PANEL = PricePanel(path)
+
+        return _PANEL
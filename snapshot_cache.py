@@ -0,0 +1,251 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# ---------------------------
+# Single-flight, stale-while-revalidate cache
+# ---------------------------
+# - A missing key is computed once; concurrent callers wait for
+#   that one computation and share its result (or its error).
+# - A present key is always served immediately. If it has been
+#   invalidated, or `check_interval` seconds passed since its data
+#   version was last checked, one background refresh is started.
+# - The background refresh only recomputes when the entry was
+#   invalidated or `version_fn()` changed, so other processes pick
+#   up new ingestions without a wall-clock expiry.
+
+class _Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SnapshotCache:
+
+    def __init__(self, version_fn=None, check_interval=60):
+
+        self.version_fn = version_fn
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._flights = {}
+
+        # Bumped on invalidate; a computation that started before
+        # the bump stores its result already marked stale
+        self._epoch = 0
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+
+    def get(self, key, loader):
+
+        with self._lock:
+
+            entry = self._entries.get(key)
+
+            if entry is not None:
+
+                if entry["stale"] or time.time() - entry["checked_at"] >= self.check_interval:
+                    self._start_refresh(key, loader)
+
+                return entry["value"]
+
+            flight = self._flights.get(key)
+            leader = flight is None
+
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if leader:
+            self._run(key, loader, flight)
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+
+        return flight.value
+
+    def invalidate(self, key=None, loader=None):
+
+        with self._lock:
+
+            self._epoch += 1
+
+            keys = list(self._entries) if key is None else [key]
+
+            for k in keys:
+                if k in self._entries:
+                    self._entries[k]["stale"] = True
+
+            # Warm the entry now instead of on the next request
+            if loader is not None:
+                for k in keys:
+                    if k in self._entries:
+                        self._start_refresh(k, loader)
+
+    def clear(self):
+
+        with self._lock:
+            self._entries.clear()
+
+    # ---------------------------
+    # Internals
+    # ---------------------------
+
+    def _version(self):
+        return self.version_fn() if self.version_fn else None
+
+    def _store(self, key, value, version, epoch):
+
+        self._entries[key] = {
+            "value": value,
+            "version": version,
+            "checked_at": time.time(),
+            "stale": epoch != self._epoch
+        }
+
+    def _run(self, key, loader, flight):
+
+        try:
+            epoch = self._epoch
+            version = self._version()
+            value = loader()
+
+            with self._lock:
+                if value is not None:
+                    self._store(key, value, version, epoch)
+
+            flight.value = value
+
+        except Exception as e:
+            flight.error = e
+
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+
+            flight.done.set()
+
+    def _start_refresh(self, key, loader):
+
+        # Caller holds self._lock
+        if key in self._flights:
+            return
+
+        flight = self._flights[key] = _Flight()
+
+        threading.Thread(
+            target=self._refresh,
+            args=(key, loader, flight),
+            daemon=True
+        ).start()
+
+    def _refresh(self, key, loader, flight):
+
+        try:
+            epoch = self._epoch
+            version = self._version()
+
+            with self._lock:
+                entry = self._entries.get(key)
+
+                unchanged = (
+                    entry is not None
+                    and not entry["stale"]
+                    and entry["version"] == version
+                )
+
+                if unchanged:
+                    entry["checked_at"] = time.time()
+
+            if unchanged:
+                flight.value = entry["value"]
+                return
+
+            value = loader()
+
+            with self._lock:
+                if value is not None:
+                    self._store(key, value, version, epoch)
+
+            flight.value = value
+
+        except Exception as e:
+            flight.error = e
+            print(f"Cache refresh failed for {key}:", e)
+
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+
+            flight.done.set()
+
+
+# ---------------------------
+# Bounded LRU cache
+# ---------------------------
+# Plain get / put with least-recently-used eviction and hit / miss
+# counters. Callers put the data version in the key, so entries for
+# old data simply age out.
+
+class LRUCache:
+
+    def __init__(self, maxsize=128):
+
+        self.maxsize = maxsize
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+
+        with self._lock:
+
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+
+        with self._lock:
+
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+
+        with self._lock:
+
+            lookups = self.hits + self.misses
+
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups * 100, 1) if lookups else None,
+            }
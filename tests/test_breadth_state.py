@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+from breadth_state import STATE_WINDOW, EMA_SPANS, build_state, state_frame
+
+
+def _history(n, seed):
+
+    rng = np.random.default_rng(seed)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    return [
+        (start + timedelta(days=i), float(c))
+        for i, c in enumerate(100 + rng.normal(0, 2, n).cumsum())
+    ]
+
+
+def test_state_frame_matches_pandas():
+
+    histories = {"LONG": _history(120, 1), "SHORT": _history(8, 2), "ONE": _history(1, 3)}
+
+    states = [build_state(symbol, bars) for symbol, bars in histories.items()]
+    frame = state_frame(states).set_index("symbol")
+
+    for symbol, bars in histories.items():
+
+        closes = pd.Series([c for _, c in bars])
+        row = frame.loc[symbol]
+
+        assert row["bar_count"] == len(closes)
+        assert row["close"] == closes.iloc[-1]
+
+        expected_prev = closes.iloc[-2] if len(closes) > 1 else np.nan
+        np.testing.assert_equal(row["prev_close"], expected_prev)
+
+        for window in (10, 20, 40):
+            expected = closes.iloc[-window:].mean() if len(closes) >= window else np.nan
+            np.testing.assert_allclose(row[f"dma{window}"], expected, rtol=1e-12)
+
+        for span in EMA_SPANS:
+            expected = closes.ewm(span=span, adjust=True).mean().iloc[-1]
+            np.testing.assert_allclose(row[f"ema{span}"], expected, rtol=1e-10)
+
+        if len(closes) >= 6:
+            expected = (closes.diff().iloc[-5:] > 0).sum() / 5 * 100
+            assert row["up_ratio_5d"] == expected
+        else:
+            assert np.isnan(row["up_ratio_5d"])
+
+
+def test_state_keeps_only_the_window():
+
+    state = build_state("A", _history(STATE_WINDOW + 15, 4))
+
+    assert len(state["closes"]) == STATE_WINDOW
+    assert state["bar_count"] == STATE_WINDOW + 15
@@ -0,0 +1,99 @@
+from datetime import date
+import pytest
+import candle_repair
+from candle_repair import find_repairs, repair_groups
+
+
+# Monday .. Friday, all sessions
+MON, TUE, WED, THU, FRI = (date(2026, 10, d) for d in range(12, 17))
+
+
+@pytest.fixture
+def stored(monkeypatch):
+
+    # symbol -> {day: (bars, malformed)}, symbol -> first stored day
+    days = {}
+    first = {}
+
+    def stored_days(db, timeframe, start, symbols):
+        return {
+            s: {d: v for d, v in days[s].items() if d >= start}
+            for s in symbols if s in days
+        }
+
+    def first_days(db, timeframe, symbols):
+        return {s: first[s] for s in symbols}
+
+    monkeypatch.setattr(candle_repair, "_stored_days", stored_days)
+    monkeypatch.setattr(candle_repair, "_first_days", first_days)
+
+    def add(symbol, full_days, first_day=None):
+        days[symbol] = {d: (candle_repair.SESSION_BARS["1d"], False) for d in full_days}
+        first[symbol] = first_day or min(full_days)
+        return days[symbol]
+
+    return add
+
+
+def _find(symbols, start=MON, end=FRI, timeframe="1d"):
+    # Any db object keeps find_repairs from opening a session
+    return find_repairs(timeframe, symbols, start, end, db=object())
+
+
+def test_window_edges_are_inclusive(stored):
+
+    stored("A", [TUE, WED, THU], first_day=date(2026, 1, 1))
+
+    assert _find(["A"]) == {"A": [(MON, "missing"), (FRI, "missing")]}
+
+    # The same gaps just outside the window are left alone
+    assert _find(["A"], start=TUE, end=THU) == {}
+
+
+def test_days_before_the_first_bar_are_not_missing(stored):
+
+    # Listed on Wednesday
+    stored("IPO", [WED, FRI])
+
+    assert _find(["IPO"]) == {"IPO": [(THU, "missing")]}
+
+
+def test_symbols_with_nothing_in_the_window_are_skipped(stored):
+
+    stored("GONE", [date(2026, 10, 1)])
+
+    assert _find(["GONE", "NEVER"]) == {}
+
+
+def test_short_and_malformed_sessions(stored):
+
+    days = stored("H", [MON, TUE, WED, THU, FRI])
+
+    want = candle_repair.SESSION_BARS["2h"]
+
+    for day in days:
+        days[day] = (want, False)
+
+    days[TUE] = (3, False)
+    days[THU] = (want, True)
+
+    assert _find(["H"], timeframe="2h") == {
+        "H": [(TUE, f"3/{want} bars"), (THU, "malformed")]
+    }
+
+
+def test_no_sessions_in_range():
+
+    # A weekend: nothing is expected, nothing is read
+    assert find_repairs("1d", ["A"], date(2026, 10, 17), date(2026, 10, 18), db=object()) == {}
+
+
+def test_groups_start_at_the_first_bad_day():
+
+    repairs = {
+        "A": [(TUE, "missing"), (THU, "missing")],
+        "B": [(TUE, "malformed")],
+        "C": [(MON, "missing")],
+    }
+
+    assert repair_groups(repairs) == [(MON, ["C"]), (TUE, ["A", "B"])]
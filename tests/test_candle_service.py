@@ -0,0 +1,79 @@
+import io
+import numpy as np
+import pandas as pd
+from candle_service import CANDLE_COLUMNS, parse_candle_copy, last_bar_per_day, dedupe_daily
+
+
+def _us(stamp):
+    return pd.Timestamp(stamp, tz="UTC").value // 1000
+
+
+def test_empty_stream_gives_empty_typed_arrays():
+
+    arrays = parse_candle_copy(io.StringIO(""))
+
+    assert len(arrays["symbols"]) == 0
+
+    assert arrays["codes"].dtype == np.int32
+    assert arrays["timestamp"].dtype == np.int64
+    assert arrays["close"].dtype == np.float64
+    assert arrays["volume"].dtype == np.int64
+
+    for c in ("codes", "timestamp", *CANDLE_COLUMNS):
+        assert len(arrays[c]) == 0
+
+
+def test_rows_parse_into_codes_and_exact_floats():
+
+    buf = io.StringIO(
+        f"AAA,{_us('2026-01-01')},0.1,0.30000000000000004,0.1,0.2,10\n"
+        f"BBB,{_us('2026-01-01')},1.5,2.5,1.0,2.0,20\n"
+    )
+
+    arrays = parse_candle_copy(buf)
+
+    assert list(arrays["symbols"]) == ["AAA", "BBB"]
+    assert list(arrays["codes"]) == [0, 1]
+    assert arrays["high"][0] == 0.1 + 0.2
+    assert list(arrays["volume"]) == [10, 20]
+
+
+def test_duplicate_ist_dates_keep_the_last_bar():
+
+    # Yahoo's two stamps for one session: 18:30 UTC the day before
+    # and 00:00 UTC, both on the IST date 2026-01-02
+    rows = [
+        ("AAA", "2026-01-01 00:00", 1.0),
+        ("AAA", "2026-01-01 18:30", 2.0),
+        ("AAA", "2026-01-02 00:00", 3.0),
+        ("AAA", "2026-01-05 00:00", 4.0),
+        ("BBB", "2026-01-01 18:30", 5.0),
+        ("BBB", "2026-01-02 00:00", 6.0),
+    ]
+
+    buf = io.StringIO("".join(
+        f"{symbol},{_us(stamp)},{close}\n" for symbol, stamp, close in rows
+    ))
+
+    arrays = parse_candle_copy(buf, ("close",))
+
+    keep = last_bar_per_day(arrays["codes"], arrays["timestamp"])
+
+    assert list(arrays["close"][keep]) == [1.0, 3.0, 4.0, 6.0]
+
+    # The frame variant agrees, whatever the row order
+    df = pd.DataFrame({
+        "symbol": [r[0] for r in rows][::-1],
+        "timestamp": pd.to_datetime([r[1] for r in rows][::-1], utc=True),
+        "close": [r[2] for r in rows][::-1],
+    })
+
+    assert list(dedupe_daily(df)["close"]) == [1.0, 3.0, 4.0, 6.0]
+
+
+def test_a_bar_per_day_is_kept_across_symbol_boundaries():
+
+    codes = np.array([0, 1], dtype=np.int32)
+    ts = np.array([_us("2026-01-02 00:00"), _us("2026-01-02 00:00")])
+
+    assert last_bar_per_day(codes, ts).all()
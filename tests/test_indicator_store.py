@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+from indicators import EMA_SPANS, ST_PERIOD, supertrend_arrays
+from indicator_store import VALUE_COLUMNS, fold_indicators
+
+
+def _bars(n, seed=7):
+
+    rng = np.random.default_rng(seed)
+
+    close = 100 + rng.normal(0, 2, n).cumsum()
+    spread = rng.uniform(0.5, 3, n)
+
+    return pd.DataFrame({
+        "timestamp": pd.date_range("2024-01-01", periods=n, freq="D", tz="UTC"),
+        "high": close + spread,
+        "low": close - spread,
+        "close": close,
+    })
+
+
+def _seed(frame):
+
+    # What SEED_SQL hands back: the last ST_PERIOD stored rows
+    return [
+        {c: (None if pd.isna(row[c]) else row[c]) for c in VALUE_COLUMNS}
+        for row in frame.iloc[-ST_PERIOD:].to_dict("records")
+    ]
+
+
+def test_full_fold_matches_the_panel_indicators():
+
+    bars = _bars(300)
+    out = fold_indicators(bars)
+
+    close = bars["close"].to_numpy()
+
+    for span in EMA_SPANS:
+        expected = pd.Series(close).ewm(span=span, adjust=False).mean().to_numpy()
+        np.testing.assert_allclose(out[f"ema{span}"], expected, rtol=1e-12)
+
+    supertrend, direction = supertrend_arrays(bars["high"], bars["low"], close)
+
+    np.testing.assert_allclose(out["supertrend"], supertrend, rtol=1e-12)
+    np.testing.assert_array_equal(out["st_direction"], direction)
+
+
+@pytest.mark.parametrize("split", [1, ST_PERIOD - 1, ST_PERIOD, 150, 299])
+def test_incremental_fold_matches_one_pass(split):
+
+    bars = _bars(300)
+
+    full = fold_indicators(bars)
+
+    head = fold_indicators(bars.iloc[:split])
+    tail = fold_indicators(bars.iloc[split:].reset_index(drop=True), _seed(head))
+
+    joined = pd.concat([head, tail], ignore_index=True)
+
+    assert list(joined["bar_index"]) == list(range(len(bars)))
+
+    for column in VALUE_COLUMNS:
+        np.testing.assert_allclose(
+            joined[column].to_numpy(dtype=np.float64),
+            full[column].to_numpy(dtype=np.float64),
+            rtol=1e-12,
+            err_msg=column
+        )
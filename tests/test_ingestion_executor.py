@@ -0,0 +1,142 @@
+import threading
+import pytest
+import ingestion_executor
+from ingestion_executor import IngestionExecutor
+
+
+class CountingBucket:
+
+    def __init__(self):
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            self.tokens += 1
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(ingestion_executor, "backoff_delay", lambda attempt: 0)
+
+
+def _flaky(failures):
+
+    # fn failing the first `failures[task]` calls for each task
+    calls = {}
+    lock = threading.Lock()
+
+    def fn(task):
+        with lock:
+            calls[task] = calls.get(task, 0) + 1
+            n = calls[task]
+
+        if n <= failures.get(task, 0):
+            raise ConnectionError(f"{task} attempt {n}")
+
+        return task * 10
+
+    return fn, calls
+
+
+def test_retries_until_success():
+
+    bucket = CountingBucket()
+    fn, calls = _flaky({1: 2})
+
+    results, failures = IngestionExecutor(workers=2, retries=3, bucket=bucket).run([1, 2], fn)
+
+    assert results == {1: 10, 2: 20}
+    assert failures == {}
+    assert calls == {1: 3, 2: 1}
+
+    # Every attempt takes a token
+    assert bucket.tokens == 4
+
+
+def test_failed_tasks_are_requeued_once():
+
+    # Task 1 needs a second round, task 2 never succeeds
+    fn, calls = _flaky({1: 2, 2: 100})
+
+    executor = IngestionExecutor(workers=2, retries=1, bucket=CountingBucket(), requeue_rounds=1)
+
+    results, failures = executor.run([1, 2, 3], fn)
+
+    assert results == {1: 10, 3: 30}
+    assert list(failures) == [2]
+    assert isinstance(failures[2], ConnectionError)
+
+    # Two attempts per round, two rounds
+    assert calls == {1: 3, 2: 4, 3: 1}
+
+
+def test_no_requeue_round():
+
+    fn, calls = _flaky({1: 2})
+
+    executor = IngestionExecutor(workers=1, retries=1, bucket=CountingBucket(), requeue_rounds=0)
+
+    results, failures = executor.run([1], fn)
+
+    assert results == {}
+    assert list(failures) == [1]
+    assert calls == {1: 2}
+
+
+def test_after_runs_once_after_the_successful_call():
+
+    events = []
+    lock = threading.Lock()
+    fn, calls = _flaky({1: 2})
+
+    def logged(task):
+        try:
+            return fn(task)
+        finally:
+            with lock:
+                events.append(("fn", task))
+
+    def after(task, result):
+        with lock:
+            events.append(("after", task))
+        return result + 1
+
+    bucket = CountingBucket()
+
+    results, failures = IngestionExecutor(workers=2, retries=3, bucket=bucket).run([1, 2], logged, after)
+
+    # after's return value is the task's result
+    assert results == {1: 11, 2: 21}
+    assert failures == {}
+
+    for task in (1, 2):
+        mine = [e for e, t in events if t == task]
+        assert mine == ["fn"] * calls[task] + ["after"]
+
+    # after takes no token
+    assert bucket.tokens == calls[1] + calls[2]
+
+
+def test_after_is_not_retried_with_the_call():
+
+    fn, calls = _flaky({})
+    seen = []
+
+    def after(task, result):
+        seen.append(task)
+        raise RuntimeError("after failed")
+
+    executor = IngestionExecutor(workers=1, retries=3, bucket=CountingBucket(), requeue_rounds=0)
+
+    with pytest.raises(RuntimeError):
+        executor.run([1], fn, after)
+
+    assert calls == {1: 1}
+    assert seen == [1]
+
+
+def test_workers_must_be_positive():
+
+    with pytest.raises(ValueError):
+        IngestionExecutor(workers=0)
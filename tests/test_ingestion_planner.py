@@ -0,0 +1,82 @@
+from datetime import date, datetime, timedelta, timezone
+import pytest
+import ingestion_planner
+from ingestion_planner import IST, FIRST_FETCH_DAYS, PROVIDER_MAX_DAYS, plan_ingestion
+
+
+# A Wednesday session; it settles at 16:30 IST
+SESSION = date(2026, 10, 14)
+
+AFTER_SETTLE = datetime(2026, 10, 14, 17, 0, tzinfo=IST)
+MID_SESSION = datetime(2026, 10, 14, 14, 0, tzinfo=IST)
+BEFORE_OPEN = datetime(2026, 10, 14, 8, 0, tzinfo=IST)
+
+
+@pytest.fixture
+def stored(monkeypatch):
+
+    latest = {}
+
+    def latest_timestamps(timeframe, symbols=None, db=None):
+        return {s: latest[s] for s in symbols if s in latest}
+
+    monkeypatch.setattr(ingestion_planner, "latest_timestamps", latest_timestamps)
+
+    return latest
+
+
+def test_splits_groups_seeds_and_skipped(stored):
+
+    stored.update({
+        "CUR": datetime(2026, 10, 14, 10, 0, tzinfo=timezone.utc),
+        # 18:30 UTC is already the next IST date
+        "LATE": datetime(2026, 10, 13, 18, 30, tzinfo=timezone.utc),
+        "GAP1": datetime(2026, 10, 12, 0, 0, tzinfo=timezone.utc),
+        "GAP2": datetime(2026, 10, 12, 0, 0, tzinfo=timezone.utc),
+        "MID": datetime(2026, 10, 13, 0, 0, tzinfo=timezone.utc),
+    })
+
+    groups, seeds, skipped = plan_ingestion(
+        "1d", ["CUR", "LATE", "GAP2", "GAP1", "MID", "NEW"], now=AFTER_SETTLE
+    )
+
+    assert groups == [
+        (date(2026, 10, 12), ["GAP2", "GAP1"]),
+        (date(2026, 10, 13), ["MID"]),
+    ]
+    assert seeds == [(SESSION - timedelta(days=FIRST_FETCH_DAYS["1d"]), ["NEW"])]
+    assert skipped == ["CUR", "LATE"]
+
+
+def test_an_unsettled_session_is_refetched(stored):
+
+    stored["CUR"] = datetime(2026, 10, 14, 5, 0, tzinfo=timezone.utc)
+
+    groups, seeds, skipped = plan_ingestion("1d", ["CUR"], now=MID_SESSION)
+
+    assert groups == [(SESSION, ["CUR"])]
+    assert seeds == []
+    assert skipped == []
+
+
+def test_before_the_open_the_previous_session_is_current(stored):
+
+    stored["PREV"] = datetime(2026, 10, 13, 0, 0, tzinfo=timezone.utc)
+    stored["OLD"] = datetime(2026, 10, 12, 0, 0, tzinfo=timezone.utc)
+
+    groups, _, skipped = plan_ingestion("1d", ["PREV", "OLD"], now=BEFORE_OPEN)
+
+    assert groups == [(date(2026, 10, 12), ["OLD"])]
+    assert skipped == ["PREV"]
+
+
+def test_gaps_are_clamped_to_the_provider_limit(stored):
+
+    stored["STALE"] = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+    groups, seeds, _ = plan_ingestion("2h", ["STALE", "NEW"], now=AFTER_SETTLE)
+
+    oldest = SESSION - timedelta(days=PROVIDER_MAX_DAYS["2h"])
+
+    assert groups == [(oldest, ["STALE"])]
+    assert seeds[0][0] >= oldest
@@ -0,0 +1,155 @@
+import threading
+import time
+import pytest
+from snapshot_cache import SnapshotCache
+
+
+def _wait_for(predicate, timeout=2):
+
+    deadline = time.monotonic() + timeout
+
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.005)
+
+
+def _start(target, n):
+
+    threads = [threading.Thread(target=target) for _ in range(n)]
+
+    for t in threads:
+        t.start()
+
+    return threads
+
+
+def test_concurrent_misses_share_one_load():
+
+    cache = SnapshotCache()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def loader():
+        calls.append(1)
+        release.wait(2)
+        return {"value": 42}
+
+    threads = _start(lambda: results.append(cache.get("k", loader)), 8)
+
+    _wait_for(lambda: calls)
+    release.set()
+
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert len(results) == 8
+    assert all(r is results[0] for r in results)
+
+
+def test_concurrent_misses_share_the_error():
+
+    cache = SnapshotCache()
+    release = threading.Event()
+    calls = []
+    errors = []
+
+    def loader():
+        calls.append(1)
+        release.wait(2)
+        raise RuntimeError("boom")
+
+    def get():
+        try:
+            cache.get("k", loader)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = _start(get, 4)
+
+    _wait_for(lambda: calls)
+    release.set()
+
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert len(errors) == 4
+
+    # Nothing was cached; the next call loads again
+    assert cache.get("k", lambda: "ok") == "ok"
+
+
+def test_invalidate_during_load_stores_the_result_stale():
+
+    cache = SnapshotCache(check_interval=3600)
+    started = threading.Event()
+    release = threading.Event()
+    loads = []
+
+    def slow():
+        loads.append("slow")
+        started.set()
+        release.wait(2)
+        return "old"
+
+    t = threading.Thread(target=lambda: cache.get("k", slow))
+    t.start()
+
+    started.wait(2)
+    cache.invalidate()
+    release.set()
+    t.join()
+
+    assert cache._entries["k"]["stale"]
+
+    def fresh():
+        loads.append("fresh")
+        return "new"
+
+    # Served at once, refreshed in the background
+    assert cache.get("k", fresh) == "old"
+
+    _wait_for(lambda: cache._entries["k"]["value"] == "new")
+
+    assert loads == ["slow", "fresh"]
+    assert not cache._entries["k"]["stale"]
+
+
+def test_refresh_skips_the_load_while_the_version_holds():
+
+    version = [1]
+    loads = []
+
+    cache = SnapshotCache(version_fn=lambda: version[0], check_interval=0)
+
+    def loader():
+        loads.append(version[0])
+        return f"v{version[0]}"
+
+    assert cache.get("k", loader) == "v1"
+
+    cache.get("k", loader)
+    _wait_for(lambda: not cache._flights)
+
+    assert loads == [1]
+
+    version[0] = 2
+    cache.get("k", loader)
+
+    _wait_for(lambda: cache._entries["k"]["value"] == "v2")
+
+    assert loads == [1, 2]
+
+
+@pytest.mark.parametrize("key", [None, "k"])
+def test_invalidate_marks_entries_stale(key):
+
+    cache = SnapshotCache(check_interval=3600)
+    cache.get("k", lambda: "v")
+
+    cache.invalidate(key)
+
+    assert cache._entries["k"]["stale"]
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from indicators import ST_UP, ST_DOWN
+from admin.strategy_registry import STRATEGIES, evaluate, evaluate_strategies
+
+
+def _panel(symbols=12, bars=60, seed=3):
+
+    rng = np.random.default_rng(seed)
+
+    close = 100 + rng.normal(0, 2, (symbols, bars)).cumsum(axis=1)
+
+    panel = {"close": close}
+
+    # EMAs ordered along a trend that flips every few bars, with
+    # noise that sometimes breaks the order, so stacks form and fail
+    trend = np.sign(rng.normal(size=(symbols, bars // 4 + 1))).repeat(4, axis=1)[:, :bars]
+
+    for rank, span in enumerate((5, 20, 55, 80, 200)):
+        panel[f"ema{span}"] = close - trend * rank + rng.normal(0, 0.6, close.shape)
+
+    panel["supertrend"] = close + rng.normal(0, 3, close.shape)
+    panel["st_direction"] = rng.choice([ST_UP, ST_DOWN], close.shape).astype(np.int8)
+
+    return panel
+
+
+def _naive(panel, key, lookback, use_live_candle):
+
+    # One symbol at a time, walking back from the last evaluated bar
+    spec = STRATEGIES[key]
+
+    signal = evaluate(spec["signal"], panel, {})
+    require = evaluate(spec["require"], panel, {}) if "require" in spec else None
+
+    last = signal.shape[1] - (1 if use_live_candle else 2)
+
+    rows = []
+
+    for i in range(signal.shape[0]):
+
+        since = next((k for k in range(last + 1) if signal[i, last - k]), None)
+
+        if since is None or since > lookback:
+            continue
+
+        if require is not None and not require[i, last]:
+            continue
+
+        rows.append((i, since))
+
+    return rows
+
+
+@pytest.mark.parametrize("use_live_candle", [True, False])
+@pytest.mark.parametrize("lookback", [0, 3, 10])
+def test_matches_a_per_symbol_scan(lookback, use_live_candle):
+
+    panel = _panel()
+
+    hits = evaluate_strategies(panel, list(STRATEGIES), lookback, use_live_candle)
+
+    for key, (rows, bars_since) in hits.items():
+
+        got = [(int(i), int(bars_since[i])) for i in rows]
+
+        assert got == _naive(panel, key, lookback, use_live_candle), key
+
+
+def test_cross_needs_the_previous_bar():
+
+    panel = _panel(symbols=1, bars=3)
+
+    panel["ema5"][0] = [1, 3, 3]
+    panel["ema20"][0] = [2, 2, 2]
+
+    rows, bars_since = evaluate_strategies(panel, ["cross_above"], 5, True)["cross_above"]
+
+    assert list(rows) == [0]
+    assert bars_since[0] == 1
+
+    # Without the live candle the cross is on the last evaluated bar
+    rows, bars_since = evaluate_strategies(panel, ["cross_above"], 5, False)["cross_above"]
+
+    assert list(rows) == [0]
+    assert bars_since[0] == 0
+
+
+def test_single_bar_without_live_candle_has_no_hits():
+
+    rows, _ = evaluate_strategies(_panel(bars=1), ["cross_above"], 5, False)["cross_above"]
+
+    assert len(rows) == 0